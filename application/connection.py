@@ -1,26 +1,90 @@
 import json
+import os
+import sys
+import threading
 from pathlib import Path
-from web3 import Web3
 
-# Connect to a local Ethereum node
-w3 = Web3(Web3.HTTPProvider('http://127.0.0.1:8545'))
+APP_DIR = Path(__file__).resolve().parent
+PROJECT_DIR = APP_DIR.parent
+# Truffle outputs: the full build artifact and the address written by the migration
+ARTIFACT_PATH = PROJECT_DIR / "build" / "contracts" / "Certification.json"
+DEPLOYMENT_CONFIG_PATH = PROJECT_DIR / "deployment_config.json"
+# Small {address, abi} file extracted from the above, so the multi-MB artifact is not parsed on every start
+CONTRACT_CACHE_PATH = Path(os.getenv("CONTRACT_CACHE_PATH", APP_DIR / "contract_cache.json"))
+PROVIDER_URI = os.getenv("WEB3_PROVIDER_URI", "http://127.0.0.1:8545")
+# Keep-alive connections to the node shared by all threads; requests beyond this open throwaway connections
+RPC_POOL_SIZE = int(os.getenv("RPC_POOL_SIZE", "32"))
 
-def get_contract_abi():
-    certification_json_path = Path('../build/contracts/Certification.json')
+_lock = threading.Lock()
+_w3 = None
+_contract = None
+
+
+def _mtime(path):
+    try:
+        return path.stat().st_mtime
+    except OSError:
+        return None
+
+
+def load_contract_info():
+    """
+    Return (address, abi) of the deployed Certification contract.
+    Reads the pre-extracted cache, regenerating it from the Truffle outputs
+    when they are newer (i.e. after a new migration).
+    """
+    cache_mtime = _mtime(CONTRACT_CACHE_PATH)
+    source_mtimes = [m for m in (_mtime(ARTIFACT_PATH), _mtime(DEPLOYMENT_CONFIG_PATH)) if m is not None]
+    if cache_mtime is not None and all(m <= cache_mtime for m in source_mtimes):
+        with open(CONTRACT_CACHE_PATH, 'r') as json_file:
+            cached = json.load(json_file)
+        return cached['address'], cached['abi']
 
     try:
-        with open(certification_json_path, 'r') as json_file:
-            certification_data = json.load(json_file)
-            return certification_data.get('abi', [])
-    except FileNotFoundError:
-        print(f"Error: {certification_json_path} not found.")
-        return []
-
-contract_abi = get_contract_abi()
-deployment_config_fpath = Path("../deployment_config.json")
-with open(deployment_config_fpath, 'r') as json_file:
-    address_data = json.load(json_file)
-contract_address = address_data.get('Certification')
-
-# Interact with the smart contract
-contract = w3.eth.contract(address=contract_address, abi=contract_abi)
+        with open(ARTIFACT_PATH, 'r') as json_file:
+            contract_abi = json.load(json_file).get('abi', [])
+        with open(DEPLOYMENT_CONFIG_PATH, 'r') as json_file:
+            contract_address = json.load(json_file).get('Certification')
+    except FileNotFoundError as e:
+        raise FileNotFoundError(
+            f"{e.filename} not found. Run `truffle migrate` from {PROJECT_DIR} to deploy the contract."
+        )
+
+    try:
+        tmp_path = CONTRACT_CACHE_PATH.with_suffix(".tmp")
+        with open(tmp_path, 'w') as json_file:
+            json.dump({'address': contract_address, 'abi': contract_abi}, json_file)
+        os.replace(tmp_path, CONTRACT_CACHE_PATH)
+    except OSError as e:
+        print(f"Error writing contract cache: {e}", file=sys.stderr)
+    return contract_address, contract_abi
+
+
+def get_w3():
+    """
+    Return the process-wide Web3 connection to the Ethereum node, created on first use
+    """
+    global _w3
+    with _lock:
+        if _w3 is None:
+            import requests
+            from web3 import Web3
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=RPC_POOL_SIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _w3 = Web3(Web3.HTTPProvider(PROVIDER_URI, session=session))
+        return _w3
+
+
+def get_contract():
+    """
+    Return the process-wide Certification contract handle, created on first use
+    """
+    global _contract
+    w3 = get_w3()
+    with _lock:
+        if _contract is None:
+            contract_address, contract_abi = load_contract_info()
+            _contract = w3.eth.contract(address=contract_address, abi=contract_abi)
+        return _contract
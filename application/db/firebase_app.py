@@ -1,6 +1,6 @@
-import pyrebase
 from dotenv import load_dotenv
 import os
+import threading
 
 load_dotenv()
 
@@ -14,13 +14,25 @@ config = {
     "appId": os.getenv("FIREBASE_APP_ID"),
 }
 
-firebase = pyrebase.initialize_app(config)
-auth = firebase.auth()
+_auth = None
+_auth_lock = threading.Lock()
+
+
+def get_auth():
+    """
+    Return the Firebase auth client, importing and initialising pyrebase on first use
+    """
+    global _auth
+    with _auth_lock:
+        if _auth is None:
+            import pyrebase
+            _auth = pyrebase.initialize_app(config).auth()
+        return _auth
 
 
 def register(email, password):
     try:
-        auth.create_user_with_email_and_password(email, password)
+        get_auth().create_user_with_email_and_password(email, password)
         return "success"
     except Exception as e:
         print(f"Error: {e}")
@@ -28,7 +40,7 @@ def register(email, password):
 
 def login(email, password):
     try:
-        auth.sign_in_with_email_and_password(email, password)
+        get_auth().sign_in_with_email_and_password(email, password)
         return "success"
     except Exception as e:
         print(f"Error: {e}")
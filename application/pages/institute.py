@@ -2,16 +2,15 @@ import os
 
 INSTITUTE_USERNAME = os.getenv("INSTITUTE_USERNAME", "admin")
 INSTITUTE_PASSWORD = os.getenv("INSTITUTE_PASSWORD", "admin123")
+RESULTS_PREVIEW_ROWS = 1000
+PROGRESS_LABELS = {'rendered': "📄 Rendered", 'pinned': "📦 Stored", 'confirmed': "⛓️ Anchored on blockchain"}
+# Seconds between refreshes of a running bulk job's progress
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2"))
 import streamlit as st
-import requests
-import json
 import os
-import pandas as pd
+import sqlite3
+import time
 from dotenv import load_dotenv
-import hashlib
-from utils.cert_utils import generate_certificate, generate_bulk_certificates, validate_certificate_data
-from utils.streamlit_utils import view_certificate
-from connection import contract, w3
 from utils.streamlit_utils import hide_icons, hide_sidebar, remove_whitespaces
 
 st.set_page_config(layout="wide", initial_sidebar_state="collapsed")
@@ -21,36 +20,94 @@ remove_whitespaces()
 
 load_dotenv()
 
-api_key = os.getenv("PINATA_API_KEY")
-api_secret = os.getenv("PINATA_API_SECRET")
 
+def submit_bulk_job(job_id, priority):
+    """
+    Hand a bulk job to the background runner and make it this session's current job
+    """
+    get_job_runner().submit(job_id, priority)
+    st.session_state['bulk_job_id'] = job_id
 
-def upload_to_pinata(file_path, api_key, api_secret):
-    # Set up the Pinata API endpoint and headers
-    pinata_api_url = "https://api.pinata.cloud/pinning/pinFileToIPFS"
-    headers = {
-        "pinata_api_key": api_key,
-        "pinata_secret_api_key": api_secret,
-    }
 
-    # Prepare the file for upload
-    with open(file_path, "rb") as file:
-        files = {"file": (file.name, file)}
+def show_bulk_job(job_id):
+    """
+    Show the progress of the session's bulk job, or its results once it has stopped.
+    Returns True while the job is still queued or running.
+    """
+    try:
+        job = BulkJob(job_id)
+    except FileNotFoundError:
+        # Deleted from another session
+        del st.session_state['bulk_job_id']
+        return False
+    status = get_job_runner().status(job_id)
+    st.markdown(f"#### Bulk Job {job_id}")
+    if status and status['state'] in (QUEUED, RUNNING):
+        progress = status['progress']
+        if status['state'] == QUEUED:
+            st.progress(0, text="⏳ Waiting for earlier jobs...")
+            return True
+        if progress is None:
+            # The runner validates and journals the roster before any row is processed
+            st.progress(0, text="🔎 Validating roster...")
+            return True
+        # One bar per stage, updated by the runner as each row moves on
+        total = max(progress['total'], 1)
+        for stage, label in PROGRESS_LABELS.items():
+            if stage in progress:
+                st.progress(min(progress[stage] / total, 1.0), text=f"{label}: {progress[stage]} of {progress['total']}")
+        return True
 
-        # Make the request to Pinata
-        response = requests.post(pinata_api_url, headers=headers, files=files)
+    if status and status['state'] == ERROR:
+        st.error(f"❌ Job stopped: {status['error']}")
+    if job.is_complete():
+        st.success("✅ Job completed!")
+    else:
+        st.warning("⚠️ Job stopped with unfinished rows; resume it to retry them.")
+    show_bulk_results(job, f"certificates_{job_id}.zip")
+    if st.button("Close Job Results", key="close_bulk_job"):
+        get_job_runner().forget(job_id)
+        del st.session_state['bulk_job_id']
+        st.rerun()
+    return False
 
-        # Parse the response
-        result = json.loads(response.text)
 
-        if "IpfsHash" in result:
-            ipfs_hash = result["IpfsHash"]
-            print(f"File uploaded to Pinata. IPFS Hash: {ipfs_hash}")
-            return ipfs_hash
-        else:
-            print(f"Error uploading to Pinata: {result.get('error', 'Unknown error')}")
-            return None
+def show_bulk_results(job, zip_name):
+    """
+    Show the job's counts, a bounded preview of its journal and the downloads
+    """
+    import pandas as pd
+    counts = job.counts()
+    finished = counts.get(job.final_stage, 0)
+    failed = job.total() - finished
+    col_result1, col_result2 = st.columns(2)
+    with col_result1:
+        st.success(f"✅ Successful: {finished}")
+    with col_result2:
+        if failed > 0:
+            st.error(f"❌ Failed or unfinished: {failed}")
+    if job.settings.get('merkle_root'):
+        st.info(f"Merkle batch root: {job.settings['merkle_root']}")
 
+    # The runner writes these when a job stops; jobs from before a restart get them here
+    results_path = job.artifact_path("results.csv")
+    zip_path = job.artifact_path("certificates.zip")
+    if not os.path.exists(results_path):
+        job.export_results(results_path)
+    if finished > 0 and not os.path.exists(zip_path):
+        job.export_zip()
+
+    st.dataframe(pd.read_csv(results_path, nrows=RESULTS_PREVIEW_ROWS, dtype=str, keep_default_na=False))
+    with open(results_path, 'rb') as f:
+        st.download_button("📄 Download Results (CSV)", f, file_name="results.csv", mime="text/csv")
+    if finished > 0:
+        with open(zip_path, 'rb') as f:
+            st.download_button(
+                label="📥 Download All Certificates (ZIP)",
+                data=f,
+                file_name=zip_name,
+                mime="application/zip"
+            )
 
 
 # Institute Login Form
@@ -70,6 +127,17 @@ if 'institute_logged_in' not in st.session_state or not st.session_state['instit
             st.error('Invalid credentials. Please try again.')
     st.stop()
 
+# Loaded only once logged in, so the login form does not pay for reportlab, pdfplumber and the chain clients
+from utils.cert_utils import generate_certificate, validate_certificate_data, compute_certificate_id
+from utils.tx_pipeline import get_transaction_pipeline
+from utils.streamlit_utils import view_certificate
+from utils.storage import get_storage, store_file
+from utils.roster_utils import REQUIRED_COLUMNS, read_roster_preview
+from utils.bulk_jobs import BulkJob, list_unfinished_jobs, ANCHOR_CERTIFICATES, ANCHOR_MERKLE
+from utils.job_runner import get_job_runner, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW, QUEUED, RUNNING, ERROR
+from utils.cert_index import get_certificate_index
+from connection import get_contract
+
 st.markdown("## 🏛️ Institute Dashboard")
 st.markdown("### Welcome to the Certificate Management System")
 
@@ -143,26 +211,33 @@ with tab1:
                 if blockchain_upload:
                     status_text.text("☁️ Uploading to IPFS...")
                     progress_bar.progress(50)
-                    if not api_key or not api_secret:
+                    if not get_storage().configured:
                         st.error("❌ Pinata API credentials not configured. Please check your .env file.")
                         st.stop()
-                    ipfs_hash = upload_to_pinata(pdf_file_path, api_key, api_secret)
+                    ipfs_hash = store_file(pdf_file_path)
                     if ipfs_hash is None:
                         st.error("❌ Failed to upload certificate to IPFS. Please check your Pinata API credentials and try again.")
                     else:
                         status_text.text("🔐 Generating certificate ID...")
                         progress_bar.progress(70)
                         if auto_generate_id:
-                            data_to_hash = f"{uid}{candidate_name}{course_name}{org_name}".encode('utf-8')
-                            certificate_id = hashlib.sha256(data_to_hash).hexdigest()
+                            certificate_id = compute_certificate_id(uid, candidate_name, course_name, org_name)
                         else:
                             certificate_id = st.text_input("Enter custom Certificate ID")
                         status_text.text("⛓️ Uploading to blockchain...")
                         progress_bar.progress(90)
                         try:
-                            contract.functions.generateCertificate(
-                                certificate_id, uid, candidate_name, course_name, org_name, ipfs_hash
-                            ).transact({'from': w3.eth.accounts[0]})
+                            # The contract only knows the root of a Merkle batch, so it cannot refuse these itself
+                            if get_certificate_index().batch_root(certificate_id):
+                                raise RuntimeError("certificate already issued in a Merkle batch")
+                            outcome = get_transaction_pipeline().submit(
+                                get_contract().functions.generateCertificate(
+                                    certificate_id, uid, candidate_name, course_name, org_name, ipfs_hash
+                                ),
+                                key=certificate_id
+                            ).result()
+                            if outcome['status'] != 'confirmed':
+                                raise RuntimeError(f"transaction {outcome['status']}: {outcome['error'] or outcome['tx_hash']}")
                             progress_bar.progress(100)
                             status_text.text("✅ Certificate successfully generated!")
                             st.success("🎉 Certificate Successfully Generated and Uploaded!")
@@ -207,6 +282,15 @@ with tab2:
     st.markdown("### Bulk Certificate Generation")
     st.markdown("Upload a CSV file or manually enter multiple student records to generate certificates in bulk.")
     
+    # Bulk jobs run in the background; higher priority jobs are started first when several are waiting
+    job_priorities = {"High": PRIORITY_HIGH, "Normal": PRIORITY_NORMAL, "Low": PRIORITY_LOW}
+    job_priority = job_priorities[st.selectbox("Job Priority", list(job_priorities), index=1)]
+    # One transaction for the whole batch's Merkle root instead of one per certificate
+    anchor_mode = ANCHOR_MERKLE if st.checkbox(
+        "Anchor as one Merkle batch (single transaction)", value=False,
+        help="Each certificate carries a proof linking it to the batch root stored on the blockchain"
+    ) else ANCHOR_CERTIFICATES
+    
     # Option selection
     bulk_option = st.radio(
         "Choose input method:",
@@ -226,89 +310,32 @@ with tab2:
         
         if uploaded_file is not None:
             try:
-                import pandas as pd
-                df = pd.read_csv(uploaded_file)
+                # Only the header and a few rows are parsed here; generation streams the rest in chunks
+                preview = read_roster_preview(uploaded_file)
                 
                 # Display preview
                 st.markdown("#### Data Preview")
-                st.dataframe(df.head())
+                st.dataframe(preview)
                 
                 # Validate columns
-                required_columns = ['uid', 'candidate_name', 'course_name']
-                missing_columns = [col for col in required_columns if col not in df.columns]
+                missing_columns = [col for col in REQUIRED_COLUMNS if col not in preview.columns]
                 
                 if missing_columns:
                     st.error(f"❌ Missing required columns: {', '.join(missing_columns)}")
                 else:
                     # Organization name input
                     org_name = st.text_input("Organization Name", placeholder="Enter your institution name")
+                    anchor_on_chain = st.checkbox("Upload to Blockchain", value=True, key="bulk_csv_chain")
                     
                     if st.button("🚀 Generate Bulk Certificates", use_container_width=True):
                         if not org_name:
                             st.error("❌ Please enter organization name!")
+                        elif anchor_on_chain and not get_storage().configured:
+                            st.error("❌ Pinata API credentials not configured. Please check your .env file.")
                         else:
-                            # Convert DataFrame to list of dictionaries
-                            certificates_data = df[required_columns].to_dict('records')
-                            
-                            # Show progress
-                            progress_bar = st.progress(0)
-                            status_text = st.empty()
-                            
-                            # Create output directory
-                            output_dir = "bulk_certificates"
-                            os.makedirs(output_dir, exist_ok=True)
-                            
-                            # Generate certificates
-                            status_text.text("📄 Generating certificates...")
-                            generated_certs = generate_bulk_certificates(
-                                certificates_data, output_dir, org_name, "../assets/logo.jpg"
-                            )
-                            
-                            # Show results
-                            progress_bar.progress(100)
-                            status_text.text("✅ Bulk generation completed!")
-                            
-                            # Display results
-                            st.markdown("#### Generation Results")
-                            
-                            success_count = sum(1 for cert in generated_certs if cert['status'] == 'success')
-                            error_count = len(generated_certs) - success_count
-                            
-                            col_result1, col_result2 = st.columns(2)
-                            with col_result1:
-                                st.success(f"✅ Successful: {success_count}")
-                            with col_result2:
-                                if error_count > 0:
-                                    st.error(f"❌ Failed: {error_count}")
-                            
-                            # Show detailed results
-                            results_df = pd.DataFrame(generated_certs)
-                            st.dataframe(results_df)
-                            
-                            # Download successful certificates as zip
-                            if success_count > 0:
-                                import zipfile
-                                zip_path = "certificates_bulk.zip"
-                                
-                                with zipfile.ZipFile(zip_path, 'w') as zipf:
-                                    for cert in generated_certs:
-                                        if cert['status'] == 'success' and cert['file_path']:
-                                            zipf.write(cert['file_path'], os.path.basename(cert['file_path']))
-                                
-                                with open(zip_path, 'rb') as f:
-                                    st.download_button(
-                                        label="📥 Download All Certificates (ZIP)",
-                                        data=f.read(),
-                                        file_name=zip_path,
-                                        mime="application/zip"
-                                    )
-                                
-                                # Clean up
-                                os.remove(zip_path)
-                                for cert in generated_certs:
-                                    if cert['file_path'] and os.path.exists(cert['file_path']):
-                                        os.remove(cert['file_path'])
-                                os.rmdir(output_dir)
+                            # Save the roster as a resumable job and queue it; the runner validates it and shows progress below
+                            job = BulkJob.create(org_name, anchor_on_chain, csv_file=uploaded_file, anchor_mode=anchor_mode)
+                            submit_bulk_job(job.job_id, job_priority)
                             
             except Exception as e:
                 st.error(f"❌ Error processing CSV file: {str(e)}")
@@ -362,6 +389,7 @@ with tab2:
             
             # Organization name and generate button
             org_name_manual = st.text_input("Organization Name", key="bulk_org")
+            anchor_manual = st.checkbox("Upload to Blockchain", value=True, key="bulk_manual_chain")
             
             col_gen1, col_gen2 = st.columns([1, 1])
             
@@ -369,55 +397,51 @@ with tab2:
                 if st.button("🚀 Generate Certificates", use_container_width=True):
                     if not org_name_manual:
                         st.error("❌ Please enter organization name!")
+                    elif anchor_manual and not get_storage().configured:
+                        st.error("❌ Pinata API credentials not configured. Please check your .env file.")
                     else:
-                        # Generate certificates
-                        progress_bar = st.progress(0)
-                        status_text = st.empty()
-                        
-                        output_dir = "manual_certificates"
-                        os.makedirs(output_dir, exist_ok=True)
-                        
-                        status_text.text("📄 Generating certificates...")
-                        generated_certs = generate_bulk_certificates(
-                            st.session_state.student_records, output_dir, org_name_manual, "../assets/logo.jpg"
-                        )
-                        
-                        progress_bar.progress(100)
-                        status_text.text("✅ Generation completed!")
-                        
-                        # Show results and download
-                        success_count = sum(1 for cert in generated_certs if cert['status'] == 'success')
-                        st.success(f"✅ Generated {success_count} certificates successfully!")
-                        
-                        if success_count > 0:
-                            import zipfile
-                            zip_path = "manual_certificates.zip"
-                            
-                            with zipfile.ZipFile(zip_path, 'w') as zipf:
-                                for cert in generated_certs:
-                                    if cert['status'] == 'success' and cert['file_path']:
-                                        zipf.write(cert['file_path'], os.path.basename(cert['file_path']))
-                            
-                            with open(zip_path, 'rb') as f:
-                                st.download_button(
-                                    label="📥 Download Certificates (ZIP)",
-                                    data=f.read(),
-                                    file_name=zip_path,
-                                    mime="application/zip"
-                                )
-                            
-                            # Clean up
-                            os.remove(zip_path)
-                            for cert in generated_certs:
-                                if cert['file_path'] and os.path.exists(cert['file_path']):
-                                    os.remove(cert['file_path'])
-                            os.rmdir(output_dir)
+                        job = BulkJob.create(org_name_manual, anchor_manual, rows=st.session_state.student_records,
+                                             anchor_mode=anchor_mode)
+                        submit_bulk_job(job.job_id, job_priority)
             
             with col_gen2:
                 if st.button("🗑️ Clear All Records", use_container_width=True):
                     st.session_state.student_records = []
                     st.rerun()
 
+    poll_bulk_job = False
+    if 'bulk_job_id' in st.session_state:
+        poll_bulk_job = show_bulk_job(st.session_state['bulk_job_id'])
+    
+    # Jobs interrupted by a crash, a server restart or an outage can be picked up where they stopped
+    # Read from job.json alone, as this runs on every refresh while a job is polled
+    unfinished_jobs = [job_id for job_id in list_unfinished_jobs() if not get_job_runner().is_active(job_id)]
+    resume_job = None
+    if unfinished_jobs:
+        st.markdown("#### Resume Unfinished Jobs")
+        resume_id = st.selectbox("Unfinished job", unfinished_jobs)
+        try:
+            resume_job = BulkJob(resume_id)
+            st.caption(f"{resume_job.org_name}: {resume_job.done()} of {resume_job.total()} rows done")
+        except (FileNotFoundError, sqlite3.Error):
+            # Deleted from another session since the list was read
+            resume_job = None
+    if resume_job is not None:
+        col_resume1, col_resume2 = st.columns([1, 1])
+        with col_resume1:
+            if st.button("▶️ Resume Job", use_container_width=True):
+                # The results of the interrupted run are stale; certificates.zip is added to, not rebuilt
+                if os.path.exists(resume_job.artifact_path("results.csv")):
+                    os.remove(resume_job.artifact_path("results.csv"))
+                submit_bulk_job(resume_id, job_priority)
+                st.rerun()
+        with col_resume2:
+            if st.button("🗑️ Delete Job", use_container_width=True):
+                resume_job.delete()
+                if st.session_state.get('bulk_job_id') == resume_id:
+                    del st.session_state['bulk_job_id']
+                st.rerun()
+
 with tab3:
     st.markdown("### View Existing Certificates")
     st.markdown("Enter a certificate ID to view its details and  its authenticity.")
@@ -431,16 +455,21 @@ with tab3:
         col_view1 = st.columns([1])
         with col_view1[0]:
             submit_view = st.form_submit_button("🔍 View Certificate", use_container_width=True)
-        if submit_view:
-            if not certificate_id:
-                st.error("❌ Please enter a certificate ID!")
-            else:
-                try:
-                    if submit_view:
-                        view_certificate(certificate_id)
-                    else:
-                        st.error("❌ Certificate not found or not verified!")
-        
-                except Exception as e:
-                    st.error("❌ Invalid Certificate ID or certificate not found!")
+    # Shown below the form: the download button cannot be placed inside one
+    if submit_view:
+        if not certificate_id:
+            st.error("❌ Please enter a certificate ID!")
+        else:
+            try:
+                if submit_view:
+                    view_certificate(certificate_id)
+                else:
+                    st.error("❌ Certificate not found or not verified!")
+    
+            except Exception as e:
+                st.error("❌ Invalid Certificate ID or certificate not found!")
 
+# Refresh a running bulk job's progress last, so every tab has rendered before the rerun
+if poll_bulk_job:
+    time.sleep(JOB_POLL_SECONDS)
+    st.rerun()
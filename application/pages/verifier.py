@@ -1,9 +1,6 @@
 import streamlit as st
-import os
-import hashlib
-from utils.cert_utils import extract_certificate
 from utils.streamlit_utils import view_certificate
-from connection import contract
+from utils.verify_utils import parse_certificate_pdf, verify_certificate_id, verify_parsed_certificate
 from utils.streamlit_utils import displayPDF, hide_icons, hide_sidebar, remove_whitespaces
 from streamlit_extras.switch_page_button import switch_page
 
@@ -36,33 +33,32 @@ if selected == options[0]:
     st.markdown("### Verify Certificate using PDF")
     uploaded_file = st.file_uploader("Upload the PDF version of the certificate")
     if uploaded_file is not None:
+        # Parse the upload in memory so concurrent sessions never share a file
         bytes_data = uploaded_file.getvalue()
-        with open("certificate.pdf", "wb") as file:
-            file.write(bytes_data)
         try:
-            (uid, candidate_name, course_name, org_name, embedded_hash) = extract_certificate("certificate.pdf")
-            st.write(f"[DEBUG] Verification Extracted UID: {uid}")
-            st.write(f"[DEBUG] Verification Extracted Name: {candidate_name}")
-            st.write(f"[DEBUG] Verification Extracted Course: {course_name}")
-            st.write(f"[DEBUG] Verification Extracted Org: {org_name}")
-            st.write(f"[DEBUG] Embedded hash found in PDF: {embedded_hash}")
-            displayPDF("certificate.pdf")
-            os.remove("certificate.pdf")
+            # Same parsing and lookup as the verification service (scripts/verify_service.py)
+            parsed = parse_certificate_pdf(bytes_data)
+            extracted = parsed['extracted']
+            st.write(f"[DEBUG] Verification Extracted UID: {extracted['uid']}")
+            st.write(f"[DEBUG] Verification Extracted Name: {extracted['candidate_name']}")
+            st.write(f"[DEBUG] Verification Extracted Course: {extracted['course_name']}")
+            st.write(f"[DEBUG] Verification Extracted Org: {extracted['org_name']}")
+            st.write(f"[DEBUG] Embedded hash found in PDF: {parsed['embedded_hash']}")
+            displayPDF(bytes_data)
 
-            
-            # Prefer embedded certificate hash from PDF when available
-            if embedded_hash:
-                certificate_id = embedded_hash
+            certificate_id = parsed['certificate_id']
+            if parsed['embedded_hash']:
                 st.write(f"[DEBUG] Using embedded certificate hash from PDF: {certificate_id}")
             else:
-                # Fallback: recompute from extracted fields
-                data_to_hash = f"{uid}{candidate_name}{course_name}{org_name}".encode('utf-8')
-                certificate_id = hashlib.sha256(data_to_hash).hexdigest()
                 st.write(f"[DEBUG] Recomputed Verification Generated Hash: {certificate_id}")
 
-            # Debug blockchain verification
-            st.write(f"[DEBUG] Checking certificate on blockchain with ID: {certificate_id}")
-            result = contract.functions.isVerified(certificate_id).call()
+            if parsed['merkle']:
+                # Batch certificates are checked against their proof and the batch root on chain
+                st.write(f"[DEBUG] Merkle proof valid: {parsed['proof_valid']}")
+                st.write(f"[DEBUG] Checking batch root on blockchain: {parsed['merkle']['root']}")
+            else:
+                st.write(f"[DEBUG] Checking certificate on blockchain with ID: {certificate_id}")
+            result = verify_parsed_certificate(parsed)['valid']
             st.write(f"[DEBUG] Blockchain verification result: {result}")
             
             if not result:
@@ -70,17 +66,7 @@ if selected == options[0]:
                 st.write("1. Certificate ID not found on blockchain")
                 st.write("2. Extracted data might differ from registration data")
                 st.write("3. PDF format might have changed")
-                
-                # Try to get registered certificate data for comparison
-                try:
-                    registered_data = contract.functions.getCertificate(certificate_id).call()
-                    st.write("\nRegistered certificate data:")
-                    st.write(f"UID: {registered_data[0]}")
-                    st.write(f"Name: {registered_data[1]}")
-                    st.write(f"Course: {registered_data[2]}")
-                    st.write(f"Organization: {registered_data[3]}")
-                except Exception as e:
-                    st.write("\nNo registered certificate found with this ID")
+                st.write("\nNo registered certificate found with this ID")
             if result:
                 st.success("Certificated validated successfully!")
             else:
@@ -100,8 +86,16 @@ elif selected == options[1]:
             
         try:
             # First verify on blockchain
-            result = contract.functions.isVerified(certificate_id).call()
+            verification = verify_certificate_id(certificate_id)
+            result = verification['valid']
             if not result:
+                merkle_root = verification['in_anchored_batch']
+                if merkle_root:
+                    # Batch certificates are on chain only through their batch's Merkle root
+                    st.info(f"ℹ️ This certificate was issued in a batch anchored on the blockchain (Merkle root {merkle_root}). "
+                            "Its ID is not stored on chain by itself, so verify it by uploading the certificate PDF, "
+                            "which carries its inclusion proof.")
+                    st.stop()
                 st.error("❌ Certificate ID not found on blockchain")
                 st.stop()
                 
@@ -0,0 +1,115 @@
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+# Application directory; entry points are measured with it on sys.path, as Streamlit runs them
+SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENTRY_POINTS = [
+    "app.py",
+    "pages/institute.py",
+    "pages/login.py",
+    "pages/register.py",
+    "pages/verifier.py",
+    "scripts/check_certificate.py",
+]
+BASELINE_PATH = os.path.join(SCRIPT_DIR, "scripts", "startup_baseline.json")
+# Increases smaller than this are noise, whatever the relative change
+MIN_REGRESSION = {"seconds": 0.01, "rss_mb": 2.0}
+
+# Runs in a fresh interpreter: executes only the entry point's module-level imports
+# and reports wall time and peak RSS, so nothing in the page itself has to run.
+# Missing optional packages are reported rather than aborting the measurement.
+MEASURE = """
+import json, resource, sys, time
+sys.path.insert(0, {app_dir!r})
+statements = [compile(source, {name!r}, "exec") for source in {sources!r}]
+namespace = {{"__name__": "__bench__", "__file__": {path!r}}}
+errors = []
+started = time.perf_counter()
+for code in statements:
+    try:
+        exec(code, namespace)
+    except Exception as e:
+        errors.append(f"{{type(e).__name__}}: {{e}}")
+elapsed = time.perf_counter() - started
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{"seconds": elapsed, "rss_mb": rss_kb / 1024, "modules": len(sys.modules), "errors": errors}}))
+"""
+
+
+def module_level_imports(path):
+    """
+    Return the source of each import statement every cold start of path executes
+    (top level and inside top-level try blocks, but not in functions or branches)
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), path)
+    statements = []
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            statements.append(node)
+        elif isinstance(node, ast.Try):
+            statements.extend(n for n in node.body if isinstance(n, (ast.Import, ast.ImportFrom)))
+    return [ast.unparse(node) for node in statements]
+
+
+def measure(entry_point, runs):
+    path = os.path.join(SCRIPT_DIR, entry_point)
+    code = MEASURE.format(app_dir=SCRIPT_DIR, sources=module_level_imports(path), name=entry_point, path=path)
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", code], cwd=SCRIPT_DIR, capture_output=True, text=True, check=True
+        ).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        "seconds": statistics.median(s["seconds"] for s in samples),
+        "rss_mb": max(s["rss_mb"] for s in samples),
+        "modules": samples[-1]["modules"],
+        "errors": samples[-1]["errors"],
+    }
+
+
+parser = argparse.ArgumentParser(description="Measure cold-import time and peak RSS of each page entry point.")
+parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per entry point (median time is reported)")
+parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON to compare against")
+parser.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline")
+parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative increase before flagging a regression")
+args = parser.parse_args()
+
+baseline = {}
+if not args.save_baseline and os.path.exists(args.baseline):
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+
+results = {}
+regressions = []
+print(f"{'entry point':<30} {'import ms':>10} {'rss MB':>8} {'modules':>8}")
+for entry_point in ENTRY_POINTS:
+    result = results[entry_point] = measure(entry_point, args.runs)
+    line = f"{entry_point:<30} {result['seconds'] * 1000:>10.1f} {result['rss_mb']:>8.1f} {result['modules']:>8}"
+    previous = baseline.get(entry_point)
+    if previous:
+        for metric in ("seconds", "rss_mb"):
+            increase = result[metric] - previous[metric]
+            if increase > previous[metric] * args.tolerance and increase > MIN_REGRESSION[metric]:
+                regressions.append(f"{entry_point}: {metric} {previous[metric]:.3f} -> {result[metric]:.3f}")
+                line += f"  REGRESSION ({metric})"
+    if result["errors"]:
+        line += f"  [imports failed: {'; '.join(result['errors'])}]"
+    print(line)
+
+if args.save_baseline:
+    with open(args.baseline, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Baseline written to {args.baseline}")
+
+if regressions:
+    print("Startup regressions beyond tolerance:")
+    for regression in regressions:
+        print(f"  {regression}")
+    sys.exit(1)
@@ -1,34 +1,156 @@
+import argparse
+import csv
+import json
 import sys
 import os
-# Ensure application directory is on path so we can import connection
+import time
+from concurrent.futures import ThreadPoolExecutor
+# Ensure application directory is on path so we can import the lookup helpers
 SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if SCRIPT_DIR not in sys.path:
     sys.path.append(SCRIPT_DIR)
 
-try:
-    from connection import contract
-except Exception as e:
-    print("Error importing 'connection'. This usually means the contract ABI/address files are missing (build/contracts/Certification.json or deployment_config.json).")
-    print("Please ensure you have run your Truffle migrations and that 'deployment_config.json' exists in the project root.")
-    print("Example steps:")
-    print("  1) Start Ganache or an Ethereum node: ganache-cli -h 127.0.0.1 -p 8545")
-    print("  2) Run truffle migrate from the project root to generate build files and deployment_config.json")
-    print("Then re-run this script.")
-    print(f"Underlying error: {e}")
-    sys.exit(2)
-
-if len(sys.argv) < 2:
-    print("Usage: python check_certificate.py <certificate_id>")
-    sys.exit(1)
-
-cert_id = sys.argv[1]
+# Exit codes
+EXIT_ALL_VALID = 0
+EXIT_USAGE = 1
+EXIT_RPC_FAILURE = 2
+EXIT_SOME_MISSING = 3
+
+FIELDS = ["certificate_id", "valid", "uid", "candidate_name", "course_name", "org_name", "ipfs_hash", "error"]
+
+
+class _ArgumentParser(argparse.ArgumentParser):
+    def error(self, message):
+        self.print_usage(sys.stderr)
+        print(f"Error: {message}", file=sys.stderr)
+        sys.exit(EXIT_USAGE)
+
+
+parser = _ArgumentParser(
+    description="Check certificate ids against the chain.",
+    epilog=f"Exit codes: {EXIT_ALL_VALID} all valid, {EXIT_SOME_MISSING} some missing (--batch only; a "
+           f"single id that is not found exits {EXIT_ALL_VALID} as before), {EXIT_RPC_FAILURE} RPC failure, "
+           f"{EXIT_USAGE} usage error."
+)
+parser.add_argument("cert_id", nargs="?", help="Single certificate id to check")
+parser.add_argument("--batch", metavar="FILE", help="Read one id per line from FILE ('-' for stdin)")
+parser.add_argument("--format", choices=["jsonl", "csv"], default="jsonl", help="Batch output format")
+parser.add_argument("--concurrency", type=int, default=8, help="Batched calls in flight at once")
+parser.add_argument("--chunk-size", type=int, default=500, help="Ids per batched call")
+parser.add_argument("--no-index", action="store_true", help="Skip the local index and always ask the chain")
+args = parser.parse_args()
+
+if bool(args.cert_id) == bool(args.batch):
+    parser.error("pass either a certificate id or --batch FILE")
+
+# The contract is only loaded on the first lookup; a missing deployment surfaces there as an RPC failure
+from utils.cert_index import lookup_certificate, lookup_certificates
+
+
+def read_id_chunks(stream, chunk_size):
+    chunk = []
+    for line in stream:
+        cert_id = line.strip()
+        if cert_id:
+            chunk.append(cert_id)
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def check_chunk(chunk):
+    """
+    Look up one chunk of ids; returns (rows, latency_seconds, rpc_failed)
+    """
+    started = time.perf_counter()
+    try:
+        records = lookup_certificates(chunk, use_index=not args.no_index)
+        rows = [
+            {
+                "certificate_id": cert_id,
+                "valid": record is not None,
+                **dict(zip(FIELDS[2:7], record or [None] * 5)),
+                "error": None,
+            }
+            for cert_id, record in zip(chunk, records)
+        ]
+        failed = False
+    except Exception as e:
+        rows = [{**dict.fromkeys(FIELDS), "certificate_id": cert_id, "valid": False, "error": str(e)} for cert_id in chunk]
+        failed = True
+    return rows, time.perf_counter() - started, failed
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def run_batch(stream):
+    if args.format == "csv":
+        writer = csv.DictWriter(sys.stdout, fieldnames=FIELDS)
+        writer.writeheader()
+        emit = writer.writerow
+    else:
+        emit = lambda row: sys.stdout.write(json.dumps(row) + "\n")
+
+    total = missing = errors = 0
+    latencies = []
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        in_flight = []
+        chunks = read_id_chunks(stream, args.chunk_size)
+        while True:
+            # Keep a bounded window of chunks in flight and emit them in input order
+            while len(in_flight) < args.concurrency:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                in_flight.append(executor.submit(check_chunk, chunk))
+            if not in_flight:
+                break
+            rows, latency, failed = in_flight.pop(0).result()
+            latencies.append(latency)
+            for row in rows:
+                emit(row)
+            sys.stdout.flush()
+            total += len(rows)
+            if failed:
+                errors += len(rows)
+            else:
+                missing += sum(1 for row in rows if not row["valid"])
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"Checked {total} ids in {elapsed:.2f}s ({total / elapsed if elapsed else 0:.1f} ids/s): "
+        f"{total - missing - errors} valid, {missing} missing, {errors} errors; "
+        f"call latency p50 {percentile(latencies, 50) * 1000:.1f} ms, p99 {percentile(latencies, 99) * 1000:.1f} ms "
+        f"over {len(latencies)} calls",
+        file=sys.stderr
+    )
+    if errors:
+        return EXIT_RPC_FAILURE
+    return EXIT_SOME_MISSING if missing else EXIT_ALL_VALID
+
+
+if args.batch:
+    if args.batch == "-":
+        sys.exit(run_batch(sys.stdin))
+    with open(args.batch, "r") as id_file:
+        sys.exit(run_batch(id_file))
+
+cert_id = args.cert_id
 print(f"Checking certificate id: {cert_id}")
 
 try:
-    exists = contract.functions.isVerified(cert_id).call()
+    data = lookup_certificate(cert_id, use_index=not args.no_index)
+    exists = data is not None
     print(f"isVerified: {exists}")
     if exists:
-        data = contract.functions.getCertificate(cert_id).call()
         print("Registered certificate data:")
         print(f"  uid: {data[0]}")
         print(f"  candidate_name: {data[1]}")
@@ -39,4 +161,4 @@ try:
         print("Certificate ID not found on-chain.")
 except Exception as e:
     print(f"Error querying contract: {e}")
-    sys.exit(2)
+    sys.exit(EXIT_RPC_FAILURE)
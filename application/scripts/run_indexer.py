@@ -0,0 +1,31 @@
+import argparse
+import os
+import sys
+import time
+# Ensure application directory is on path so we can import the index
+SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SCRIPT_DIR not in sys.path:
+    sys.path.append(SCRIPT_DIR)
+
+from utils.cert_index import get_certificate_index
+
+parser = argparse.ArgumentParser(description="Keep the local certificate index in sync with the chain.")
+parser.add_argument("--once", action="store_true", help="Sync once and exit instead of tailing")
+parser.add_argument("--interval", type=float, default=2.0, help="Seconds between polls when tailing")
+args = parser.parse_args()
+
+index = get_certificate_index()
+print(f"Indexing into {index.path} from block {index.cursor() + 1}")
+
+while True:
+    try:
+        added = index.sync()
+        if added:
+            print(f"Indexed {added} certificates up to block {index.cursor()} ({index.count()} total)")
+    except Exception as e:
+        print(f"Error syncing certificate index: {e}")
+        if args.once:
+            sys.exit(2)
+    if args.once:
+        break
+    time.sleep(args.interval)
@@ -0,0 +1,164 @@
+import argparse
+import asyncio
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+# Ensure application directory is on path so we can import the verification helpers
+SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SCRIPT_DIR not in sys.path:
+    sys.path.append(SCRIPT_DIR)
+
+from aiohttp import web
+from utils.async_chain import AsyncContractClient
+from utils.verify_utils import parse_certificate_pdf, verify_certificate_ids_async, verify_parsed_certificate_async
+
+# Requests admitted at once; beyond this the service answers 503 with Retry-After instead of queueing
+MAX_IN_FLIGHT = int(os.getenv("VERIFY_MAX_IN_FLIGHT", "2000"))
+# Processes parsing uploaded PDFs, and how many parses may wait for one before uploads are refused
+PDF_WORKERS = int(os.getenv("VERIFY_PDF_WORKERS", os.cpu_count() or 1))
+PDF_QUEUE = PDF_WORKERS * 4
+MAX_UPLOAD_BYTES = int(os.getenv("VERIFY_MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+MAX_BATCH_IDS = 1000
+RETRY_AFTER_SECONDS = 1
+
+IN_FLIGHT = web.AppKey("in_flight", dict)
+PDF_POOL = web.AppKey("pdf_pool", ProcessPoolExecutor)
+PDF_SLOTS = web.AppKey("pdf_slots", asyncio.Semaphore)
+CHAIN = web.AppKey("chain", AsyncContractClient)
+
+
+def _error(status, message, **headers):
+    return web.json_response({"error": message}, status=status, headers=headers)
+
+
+def _saturated():
+    return _error(503, "Verification service is saturated, please retry shortly", **{"Retry-After": str(RETRY_AFTER_SECONDS)})
+
+
+@web.middleware
+async def backpressure(request, handler):
+    """
+    Refuse requests outright once MAX_IN_FLIGHT are being served, so overload
+    shows up as fast 503s rather than ever-growing latency
+    """
+    # A mutable holder, as the app's own state is frozen once it starts
+    in_flight = request.app[IN_FLIGHT]
+    if in_flight["count"] >= MAX_IN_FLIGHT:
+        return _saturated()
+    in_flight["count"] += 1
+    try:
+        return await handler(request)
+    finally:
+        in_flight["count"] -= 1
+
+
+async def _lookup(request, certificate_ids):
+    """
+    Verify ids against the index and, for misses, the chain; None means the chain could not be reached
+    """
+    try:
+        return await verify_certificate_ids_async(request.app[CHAIN], certificate_ids)
+    except Exception as e:
+        print(f"Error looking up certificate: {e}")
+        return None
+
+
+async def _read_upload(request):
+    """
+    Return the uploaded PDF: the 'file' field of a multipart form, or the raw request body
+    """
+    if not request.content_type.startswith("multipart/"):
+        return await request.read()
+    reader = await request.multipart()
+    async for field in reader:
+        if field.name != "file":
+            continue
+        data = bytearray()
+        while True:
+            chunk = await field.read_chunk()
+            if not chunk:
+                return bytes(data)
+            data += chunk
+            if len(data) > MAX_UPLOAD_BYTES:
+                raise web.HTTPRequestEntityTooLarge(max_size=MAX_UPLOAD_BYTES, actual_size=len(data))
+    return None
+
+
+async def health(request):
+    return web.json_response({"status": "ok", "in_flight": request.app[IN_FLIGHT]["count"]})
+
+
+async def verify_id(request):
+    certificate_id = request.match_info["certificate_id"]
+    results = await _lookup(request, [certificate_id])
+    if results is None:
+        return _error(502, "Could not reach the blockchain, please retry shortly")
+    return web.json_response(results[0])
+
+
+async def verify_batch(request):
+    try:
+        body = await request.json()
+    except ValueError:
+        return _error(400, "Body must be JSON: {\"certificate_ids\": [...]}")
+    certificate_ids = body.get("certificate_ids") if isinstance(body, dict) else None
+    if not isinstance(certificate_ids, list) or not all(isinstance(i, str) for i in certificate_ids):
+        return _error(400, "certificate_ids must be a list of strings")
+    if len(certificate_ids) > MAX_BATCH_IDS:
+        return _error(413, f"At most {MAX_BATCH_IDS} ids per batch")
+    results = await _lookup(request, certificate_ids)
+    if results is None:
+        return _error(502, "Could not reach the blockchain, please retry shortly")
+    return web.json_response({"results": results})
+
+
+async def verify_pdf(request):
+    slots = request.app[PDF_SLOTS]
+    # Parsing is the expensive part; refuse new uploads rather than queue them without bound
+    if slots.locked():
+        return _saturated()
+    async with slots:
+        data = await _read_upload(request)
+        if not data:
+            return _error(400, "Upload the certificate PDF as the 'file' form field or as the request body")
+        try:
+            parsed = await asyncio.get_running_loop().run_in_executor(request.app[PDF_POOL], parse_certificate_pdf, data)
+        except Exception as e:
+            return _error(422, f"Could not read a certificate from this PDF ({e})")
+    if not parsed["embedded_hash"] and not any(parsed["extracted"].values()):
+        return _error(422, "Could not read a certificate from this PDF")
+    try:
+        # Merkle-batch certificates cost one root read; the rest the usual id lookup
+        result = await verify_parsed_certificate_async(request.app[CHAIN], parsed)
+    except Exception as e:
+        print(f"Error looking up certificate: {e}")
+        return _error(502, "Could not reach the blockchain, please retry shortly")
+    return web.json_response(result)
+
+
+async def executors(app):
+    app[PDF_POOL] = ProcessPoolExecutor(max_workers=PDF_WORKERS)
+    app[PDF_SLOTS] = asyncio.Semaphore(PDF_QUEUE)
+    app[CHAIN] = AsyncContractClient()
+    yield
+    app[PDF_POOL].shutdown()
+    await app[CHAIN].close()
+
+
+def create_app():
+    app = web.Application(client_max_size=MAX_UPLOAD_BYTES, middlewares=[backpressure])
+    app[IN_FLIGHT] = {"count": 0}
+    app.cleanup_ctx.append(executors)
+    app.router.add_get("/health", health)
+    app.router.add_get("/verify/{certificate_id}", verify_id)
+    app.router.add_post("/verify/batch", verify_batch)
+    app.router.add_post("/verify/pdf", verify_pdf)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTTP service for verifying certificates by id, batch or PDF upload.")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=8600, help="Port to listen on")
+    args = parser.parse_args()
+    web.run_app(create_app(), host=args.host, port=args.port, backlog=1024)
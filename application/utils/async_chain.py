@@ -0,0 +1,213 @@
+import asyncio
+import itertools
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from connection import PROVIDER_URI, RPC_POOL_SIZE, get_contract
+from utils.tx_pipeline import CANCEL_GAS, GAS_PRICE_BUMP, MAX_REPLACEMENTS, STUCK_TIMEOUT
+
+# Seconds an RPC request may take before it fails
+RPC_TIMEOUT = float(os.getenv("RPC_TIMEOUT", "10"))
+RECEIPT_POLL_INTERVAL = 0.5
+
+
+class AsyncRPCError(Exception):
+    """
+    Raised when the node answers a JSON-RPC request with an error
+    """
+
+
+class AsyncContractClient:
+    """
+    Non-blocking client for the Certification contract, for use on an asyncio
+    event loop. Calls are encoded and decoded with the regular contract handle
+    (which never touches the network for that) and sent as JSON-RPC over one
+    pooled aiohttp session, so hundreds of reads can be in flight at once.
+    Use it as an async context manager, or call close() when done.
+    """
+
+    def __init__(self, provider_uri=PROVIDER_URI, pool_size=RPC_POOL_SIZE, timeout=RPC_TIMEOUT):
+        import aiohttp
+        self.provider_uri = provider_uri
+        self.contract = get_contract()
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=pool_size),
+            timeout=aiohttp.ClientTimeout(total=timeout),
+        )
+        self._ids = itertools.count()
+        self._nonces = {}
+        self._nonce_lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        await self._session.close()
+
+    async def _rpc(self, method, params):
+        payload = {"jsonrpc": "2.0", "id": next(self._ids), "method": method, "params": params}
+        async with self._session.post(self.provider_uri, json=payload) as response:
+            response.raise_for_status()
+            body = await response.json(content_type=None)
+        if body.get("error"):
+            raise AsyncRPCError(body["error"].get("message", str(body["error"])))
+        return body["result"]
+
+    async def _call(self, contract_fn):
+        # web3 5.x ships no async contract layer, so encode and decode through the sync one
+        from hexbytes import HexBytes
+        from web3._utils.abi import get_abi_output_types
+        result = await self._rpc("eth_call", [
+            {"to": self.contract.address, "data": contract_fn._encode_transaction_data()}, "latest"
+        ])
+        decoded = self.contract.web3.codec.decode_abi(get_abi_output_types(contract_fn.abi), HexBytes(result))
+        return decoded[0] if len(decoded) == 1 else tuple(decoded)
+
+    async def is_verified(self, certificate_id):
+        return await self._call(self.contract.functions.isVerified(certificate_id))
+
+    async def get_certificate(self, certificate_id):
+        """
+        Return (uid, candidate_name, course_name, org_name, ipfs_hash), or None if it was never issued
+        """
+        try:
+            return await self._call(self.contract.functions.getCertificate(certificate_id))
+        except AsyncRPCError as e:
+            # getCertificate reverts for unknown ids
+            if "does not exist" in str(e):
+                return None
+            raise
+
+    async def get_certificates(self, certificate_ids):
+        """
+        Batched get_certificate in one eth_call; None for ids that were never issued
+        """
+        certificates = await self._call(self.contract.functions.getCertificates(list(certificate_ids)))
+        return [tuple(cert) if cert[4] else None for cert in certificates]
+
+    async def is_batch_anchored(self, merkle_root):
+        """
+        Check whether a Merkle batch root (0x-prefixed hex) has been anchored
+        """
+        return await self._call(self.contract.functions.isBatchAnchored(bytes.fromhex(merkle_root[2:])))
+
+    async def _next_nonce(self, sender):
+        async with self._nonce_lock:
+            if sender not in self._nonces:
+                self._nonces[sender] = int(await self._rpc("eth_getTransactionCount", [sender, "pending"]), 16)
+            nonce = self._nonces[sender]
+            self._nonces[sender] += 1
+            return nonce
+
+    async def _bumped_gas_price(self, tx):
+        gas_price = int(await self._rpc("eth_gasPrice", []), 16)
+        return hex(max(int(int(tx["gasPrice"], 16) * GAS_PRICE_BUMP), gas_price))
+
+    async def generate_certificate(self, certificate_id, uid, candidate_name, course_name, org_name, ipfs_hash,
+                                   sender=None, timeout=STUCK_TIMEOUT):
+        """
+        Issue one certificate and wait for it to be mined. Returns a result dict
+        shaped like the transaction pipeline's, with status 'confirmed',
+        'reverted', 'dropped' or 'error'. A transaction not mined within timeout
+        seconds is replaced with a higher gas price like the pipeline does, and
+        cancelled once MAX_REPLACEMENTS replacements are not mined either.
+        Nonces are assigned locally per client, so do not send from the same
+        account through the sync pipeline at the same time.
+        """
+        contract_fn = self.contract.functions.generateCertificate(
+            certificate_id, uid, candidate_name, course_name, org_name, ipfs_hash
+        )
+        result = {'key': certificate_id, 'status': 'error', 'tx_hash': None,
+                  'block_number': None, 'gas_used': None, 'error': None}
+        try:
+            sender = sender or (await self._rpc("eth_accounts", []))[0]
+            tx = {"from": sender, "to": self.contract.address, "data": contract_fn._encode_transaction_data()}
+        except Exception as e:
+            result['error'] = str(e)
+            return result
+        try:
+            # Estimate before taking a nonce so a reverting call never leaves a gap
+            tx["gas"] = hex(int(int(await self._rpc("eth_estimateGas", [tx]), 16) * 1.2))
+        except AsyncRPCError as e:
+            result.update(status='reverted', error=str(e))
+            return result
+        except Exception as e:
+            result['error'] = str(e)
+            return result
+
+        tx["nonce"] = hex(await self._next_nonce(sender))
+        try:
+            tx["gasPrice"] = await self._rpc("eth_gasPrice", [])
+            tx_hashes = [await self._rpc("eth_sendTransaction", [tx])]
+        except Exception as e:
+            self._nonces.pop(sender, None)
+            result['error'] = str(e)
+            return result
+
+        result['tx_hash'] = tx_hashes[0]
+        try:
+            receipt = await self.wait_for_receipt(tx_hashes, timeout)
+            replacements = 0
+            for _ in range(MAX_REPLACEMENTS):
+                if receipt is not None:
+                    break
+                # Re-send at the same nonce with a higher gas price
+                tx["gasPrice"] = await self._bumped_gas_price(tx)
+                try:
+                    tx_hashes.append(await self._rpc("eth_sendTransaction", [tx]))
+                    replacements += 1
+                except AsyncRPCError as e:
+                    # Typically "nonce too low": an earlier copy was mined and is found next poll
+                    print(f"Error replacing transaction {int(tx['nonce'], 16)}: {e}")
+                receipt = await self.wait_for_receipt(tx_hashes, timeout)
+            if receipt is None:
+                # Use the nonce up so later transactions from the sender are not queued behind it
+                await self._cancel(tx)
+                result.update(status='dropped', tx_hash=tx_hashes[-1],
+                              error=f"not mined after {replacements} replacements")
+                return result
+        except Exception as e:
+            result['error'] = str(e)
+            return result
+
+        result.update(
+            status='confirmed' if int(receipt["status"], 16) == 1 else 'reverted',
+            tx_hash=receipt["transactionHash"],
+            block_number=int(receipt["blockNumber"], 16),
+            gas_used=int(receipt["gasUsed"], 16),
+        )
+        return result
+
+    async def _cancel(self, tx):
+        """
+        Replace a transaction that will not be mined with a zero-value transfer to
+        the sender at the same nonce and a higher gas price, filling the nonce
+        """
+        cancel = {"from": tx["from"], "to": tx["from"], "value": "0x0", "nonce": tx["nonce"],
+                  "gas": hex(CANCEL_GAS), "gasPrice": await self._bumped_gas_price(tx)}
+        try:
+            await self._rpc("eth_sendTransaction", [cancel])
+        except AsyncRPCError as e:
+            # Typically "nonce too low": the original was mined after all
+            print(f"Error cancelling transaction {int(tx['nonce'], 16)}: {e}")
+
+    async def wait_for_receipt(self, tx_hashes, timeout=STUCK_TIMEOUT, poll_interval=RECEIPT_POLL_INTERVAL):
+        """
+        Wait for a transaction, or any of its replacements when given a list of
+        hashes, to be mined and return its receipt; None if none is mined within
+        timeout seconds
+        """
+        if isinstance(tx_hashes, str):
+            tx_hashes = [tx_hashes]
+        deadline = asyncio.get_running_loop().time() + timeout
+        while True:
+            for tx_hash in list(tx_hashes):
+                receipt = await self._rpc("eth_getTransactionReceipt", [tx_hash])
+                if receipt is not None:
+                    return receipt
+            if asyncio.get_running_loop().time() >= deadline:
+                return None
+            await asyncio.sleep(poll_interval)
@@ -0,0 +1,733 @@
+import csv
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import warnings
+import zipfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.cert_utils import iter_bulk_certificates, compute_certificate_id
+from utils.merkle_utils import MerkleTree
+from utils.roster_utils import iter_roster_rows, iter_record_rows
+from utils.storage import get_storage, store_bulk_certificates, StorageError
+
+JOBS_DIR = os.getenv(
+    "BULK_JOBS_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "jobs")
+)
+# Rows fetched from the journal and carried through render, store and anchor together
+JOB_CHUNK = int(os.getenv("ANCHOR_CHUNK", "500"))
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", os.cpu_count() or 1))
+# Render processes run this much nicer than the app, keeping interactive pages responsive during big batches
+RENDER_NICENESS = int(os.getenv("RENDER_NICENESS", "10"))
+# Completed jobs (their ZIP, results and journal) are deleted this many days after they finish
+JOB_RETENTION_DAYS = float(os.getenv("BULK_JOB_RETENTION_DAYS", "7"))
+# Render attempts a row of a Merkle batch gets before it is excluded, so it cannot hold up the batch's root
+MAX_RENDER_ATTEMPTS = int(os.getenv("JOB_MAX_RENDER_ATTEMPTS", "3"))
+# A row rendered again (after a Merkle tree rebuild) gets a second ZIP entry until export_zip() drops the first
+warnings.filterwarnings("ignore", "Duplicate name", UserWarning, "zipfile")
+LOGO_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "assets", "logo.jpg")
+
+# Row stages, in order. A row only ever moves forward (bar a Merkle tree
+# rebuild, see _build_merkle_tree); a failure records the error and leaves the
+# stage alone, so resuming the job retries just that step.
+PENDING = 'pending'
+RENDERED = 'rendered'
+PINNED = 'pinned'
+SUBMITTED = 'submitted'
+CONFIRMED = 'confirmed'
+# Rows that will never be processed
+INVALID = 'invalid'
+DUPLICATE = 'duplicate'
+# Rows of a Merkle batch dropped from its tree after failing to render too often
+EXCLUDED = 'excluded'
+CLOSED_STAGES = (INVALID, DUPLICATE, EXCLUDED)
+# Stages reported by progress(), each counting the rows that have reached it or gone past it
+PROGRESS_STAGES = [RENDERED, PINNED, CONFIRMED]
+
+# How an anchoring job records its certificates on chain: one transaction per
+# certificate, or one transaction for the whole batch's Merkle root with each
+# certificate carrying its inclusion proof
+ANCHOR_CERTIFICATES = 'certificates'
+ANCHOR_MERKLE = 'merkle'
+
+RESULT_FIELDS = ['row_number', 'uid', 'candidate_name', 'course_name', 'stage', 'error',
+                 'certificate_id', 'ipfs_hash', 'tx_hash', 'merkle_proof']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rows (
+    row_number INTEGER PRIMARY KEY,
+    uid TEXT,
+    candidate_name TEXT,
+    course_name TEXT,
+    stage TEXT NOT NULL,
+    error TEXT,
+    certificate_id TEXT,
+    ipfs_hash TEXT,
+    tx_hash TEXT,
+    merkle_proof TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS rows_stage ON rows (stage);
+"""
+
+
+class BulkJob:
+    """
+    A bulk issuance run backed by a directory under JOBS_DIR: job.json holds the
+    settings, journal.db records every row's stage (pending, rendered, pinned,
+    submitted, confirmed) as it completes, and certificates.zip receives each
+    certificate as it renders. run() skips work the journal says is done, so a job that was
+    interrupted by a crash, a dropped session or a Pinata/node outage picks up
+    where it stopped when it is run again.
+    """
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.directory = os.path.join(JOBS_DIR, job_id)
+        with open(os.path.join(self.directory, "job.json"), "r") as f:
+            self.settings = json.load(f)
+        self.org_name = self.settings['org_name']
+        self.anchor_on_chain = self.settings['anchor_on_chain']
+        self.anchor_mode = self.settings.get('anchor_mode', ANCHOR_CERTIFICATES)
+        self.final_stage = CONFIRMED if self.anchor_on_chain else RENDERED
+        self._local = threading.local()
+        self._progress = None
+        self._progress_callback = None
+        self._zip = None
+        self._zip_index = {}
+
+    @classmethod
+    def create(cls, org_name, anchor_on_chain, rows=None, csv_file=None, anchor_mode=ANCHOR_CERTIFICATES):
+        """
+        Set up a new job from a list of row dicts or a roster CSV and return it.
+        Only the roster is saved into the job directory here; validating and
+        journaling it is left to ingest(), which run() calls first, so the caller
+        (a page handler) never waits on the roster's size.
+        """
+        job_id = time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:8]
+        directory = os.path.join(JOBS_DIR, job_id)
+        os.makedirs(directory)
+        if csv_file is not None:
+            roster = "roster.csv"
+            if hasattr(csv_file, "seek"):
+                csv_file.seek(0)
+            with open(os.path.join(directory, roster), "wb") as f:
+                shutil.copyfileobj(csv_file, f)
+        else:
+            roster = "roster.json"
+            with open(os.path.join(directory, roster), "w") as f:
+                json.dump(list(rows), f)
+        with open(os.path.join(directory, "job.json"), "w") as f:
+            json.dump({
+                'job_id': job_id,
+                'org_name': org_name,
+                'anchor_on_chain': anchor_on_chain,
+                'anchor_mode': anchor_mode,
+                'roster': roster,
+                'ingested': False,
+                'created_at': time.time(),
+            }, f)
+        return cls(job_id)
+
+    @property
+    def ingested(self):
+        # Jobs from before ingestion moved into the runner were journaled at creation
+        return self.settings.get('ingested', True)
+
+    def ingest(self):
+        """
+        Validate the saved roster in bulk, including against certificates already
+        issued when anchoring, and journal every row: valid ones as 'pending',
+        invalid ones as 'invalid' with their validation errors. CSV rosters are
+        streamed, so they are never held in memory. With anchor_mode ANCHOR_MERKLE
+        the batch's Merkle tree is built here, so every certificate can be
+        rendered with its proof before anything is anchored. Safe to repeat
+        after an interruption; does nothing once the roster is journaled.
+        """
+        if self.ingested:
+            return
+        roster_path = os.path.join(self.directory, self.settings['roster'])
+        invalid = []
+        on_invalid = lambda row_number, row, errors: invalid.append((row_number, row, errors))
+        with open(roster_path, "rb") as roster:
+            if self.settings['roster'] == "roster.csv":
+                rows = iter_roster_rows(roster, self.org_name, on_invalid, with_row_numbers=True,
+                                        check_issued=self.anchor_on_chain)
+            else:
+                rows = iter_record_rows(json.load(roster), self.org_name, on_invalid, with_row_numbers=True,
+                                        check_issued=self.anchor_on_chain)
+            with self._connect() as conn:
+                # Rows journaled by an interrupted ingest are replaced
+                conn.execute("DELETE FROM rows")
+                batch = []
+                for row_number, row in rows:
+                    batch.append((row_number, row['uid'], row['candidate_name'], row['course_name'], PENDING, None,
+                                  row['certificate_id']))
+                    if len(batch) >= JOB_CHUNK:
+                        self._insert_rows(conn, batch + _invalid_rows(invalid))
+                        batch = []
+                self._insert_rows(conn, batch + _invalid_rows(invalid))
+        if self.anchor_on_chain and self.anchor_mode == ANCHOR_MERKLE:
+            self._build_merkle_tree()
+        self.settings['ingested'] = True
+        self._save_settings()
+        # The journal now holds every row
+        os.remove(roster_path)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(os.path.join(self.directory, "journal.db"), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            # Journals from before Merkle anchoring lack these columns
+            columns = {column[1] for column in conn.execute("PRAGMA table_info(rows)")}
+            if 'merkle_proof' not in columns:
+                conn.execute("ALTER TABLE rows ADD COLUMN merkle_proof TEXT")
+            if 'attempts' not in columns:
+                conn.execute("ALTER TABLE rows ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _insert_rows(conn, rows):
+        conn.executemany(
+            "INSERT INTO rows (row_number, uid, candidate_name, course_name, stage, error, certificate_id) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+
+    def _build_merkle_tree(self):
+        """
+        Build the Merkle tree over the certificate ids of the rows being issued,
+        in row order, journal each row's proof and record the root in job.json.
+        When rebuilding after rows were excluded, rows already rendered go back
+        to 'pending': their PDFs embed proofs against the old root.
+        """
+        conn = self._connect()
+        rows = conn.execute(
+            "SELECT row_number, certificate_id FROM rows WHERE stage IN (?, ?, ?) ORDER BY row_number",
+            (PENDING, RENDERED, PINNED)
+        ).fetchall()
+        with conn:
+            conn.execute("UPDATE rows SET merkle_proof = NULL WHERE stage = ?", (EXCLUDED,))
+            conn.execute(
+                "UPDATE rows SET stage = ?, ipfs_hash = NULL WHERE stage IN (?, ?)", (PENDING, RENDERED, PINNED)
+            )
+            if rows:
+                tree = MerkleTree([certificate_id for _, certificate_id in rows])
+                conn.executemany(
+                    "UPDATE rows SET merkle_proof = ? WHERE row_number = ?",
+                    ((json.dumps({'root': tree.root, 'proof': tree.proof(index)}), row_number)
+                     for index, (row_number, _) in enumerate(rows))
+                )
+        self.settings.update(merkle_root=tree.root if rows else None, merkle_size=len(rows))
+        self._save_settings()
+
+    def _exclude_failed_rows(self):
+        """
+        Before a Merkle batch is anchored, drop rows that keep failing to render
+        from its tree and rebuild the tree from the rest. Rows are only dropped
+        while others render, so an outage that fails every row just stops the job
+        for a later resume. Returns True if the tree was rebuilt.
+        """
+        conn = self._connect()
+        if self.settings.get('merkle_anchored'):
+            return False
+        failing = conn.execute(
+            "SELECT COUNT(*) FROM rows WHERE stage = ? AND attempts >= ?", (PENDING, MAX_RENDER_ATTEMPTS)
+        ).fetchone()[0]
+        rendered = conn.execute(
+            "SELECT COUNT(*) FROM rows WHERE stage IN (?, ?)", (RENDERED, PINNED)
+        ).fetchone()[0]
+        if not failing or not rendered:
+            return False
+        with conn:
+            conn.execute(
+                "UPDATE rows SET stage = ?, error = 'Excluded from the batch after failing to render: ' || COALESCE(error, '') "
+                "WHERE stage = ? AND attempts >= ?",
+                (EXCLUDED, PENDING, MAX_RENDER_ATTEMPTS)
+            )
+        self._build_merkle_tree()
+        return True
+
+    def _save_settings(self):
+        path = os.path.join(self.directory, "job.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.settings, f)
+        os.replace(path + ".tmp", path)
+
+    def _update(self, row_number, **fields):
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE rows SET {columns} WHERE row_number = ?", (*fields.values(), row_number))
+
+    def _open_zip(self):
+        """
+        Open certificates.zip for appending, with self._zip_index mapping row
+        numbers to their latest entry. A run that crashed while the ZIP was open
+        leaves it without a central directory; it is then started afresh and
+        _restore_zip_entries() puts the certificates back.
+        """
+        path = self.artifact_path("certificates.zip")
+        try:
+            self._zip = zipfile.ZipFile(path, 'a', compression=zipfile.ZIP_STORED)
+        except zipfile.BadZipFile:
+            print(f"Bulk job {self.job_id}: certificates.zip is damaged, rebuilding it")
+            os.remove(path)
+            self._zip = zipfile.ZipFile(path, 'a', compression=zipfile.ZIP_STORED)
+        # Entries carry their row number as their comment
+        self._zip_index = {int(info.comment): info for info in self._zip.infolist() if info.comment.isdigit()}
+        return self._zip
+
+    def _close_zip(self):
+        self._zip.close()
+        self._zip = None
+        self._zip_index = {}
+
+    def _add_to_zip(self, row_number, uid, candidate_name, pdf_bytes):
+        info = zipfile.ZipInfo(f"certificate_{uid}_{candidate_name.replace(' ', '_')}.pdf", time.localtime()[:6])
+        info.comment = str(row_number).encode()
+        self._zip.writestr(info, pdf_bytes)
+        self._zip_index[row_number] = info
+
+    def _restore_zip_entries(self):
+        """
+        Put rendered rows missing from the ZIP back into it: from pdfs/ for jobs
+        from before certificates went straight into the ZIP, else from storage.
+        Rows that were never stored are rendered again.
+        """
+        legacy_dir = os.path.join(self.directory, "pdfs")
+        rows = self._connect().execute(
+            "SELECT row_number, uid, candidate_name, ipfs_hash FROM rows WHERE stage IN (?, ?, ?, ?)",
+            (RENDERED, PINNED, SUBMITTED, CONFIRMED)
+        ).fetchall()
+        for row_number, uid, candidate_name, ipfs_hash in rows:
+            if row_number in self._zip_index:
+                continue
+            legacy_path = os.path.join(legacy_dir, f"{row_number}.pdf")
+            if os.path.exists(legacy_path):
+                with open(legacy_path, "rb") as f:
+                    self._add_to_zip(row_number, uid, candidate_name, f.read())
+            elif ipfs_hash:
+                try:
+                    self._add_to_zip(row_number, uid, candidate_name, get_storage().get(ipfs_hash))
+                except StorageError as e:
+                    print(f"Bulk job {self.job_id}: could not restore row {row_number} into certificates.zip: {e}")
+            else:
+                self._update(row_number, stage=PENDING)
+        shutil.rmtree(legacy_dir, ignore_errors=True)
+
+    def counts(self):
+        """
+        Return {stage: row count}, plus 'failed' for unfinished rows that carry an error
+        """
+        conn = self._connect()
+        counts = dict(conn.execute("SELECT stage, COUNT(*) FROM rows GROUP BY stage").fetchall())
+        counts['failed'] = conn.execute(
+            "SELECT COUNT(*) FROM rows WHERE error IS NOT NULL AND stage NOT IN (?, ?, ?, ?)",
+            (self.final_stage, *CLOSED_STAGES)
+        ).fetchone()[0]
+        return counts
+
+    def total(self):
+        return self._connect().execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+
+    def done(self):
+        """
+        Rows that need no more work (finished, invalid, duplicate or excluded)
+        """
+        return self._connect().execute(
+            "SELECT COUNT(*) FROM rows WHERE stage IN (?, ?, ?, ?)", (self.final_stage, *CLOSED_STAGES)
+        ).fetchone()[0]
+
+    def is_complete(self):
+        return self.ingested and self.done() == self.total()
+
+    def progress(self):
+        """
+        Return {stage: rows that have reached it} for the stages this job's rows
+        go through (rendered, then pinned and confirmed when anchoring), plus
+        'total', the rows being issued
+        """
+        counts = dict(self._connect().execute("SELECT stage, COUNT(*) FROM rows GROUP BY stage").fetchall())
+        order = [RENDERED, PINNED, SUBMITTED, CONFIRMED]
+        stages = PROGRESS_STAGES if self.anchor_on_chain else [RENDERED]
+        progress = {stage: sum(counts.get(s, 0) for s in order[order.index(stage):]) for stage in stages}
+        progress['total'] = sum(counts.values()) - sum(counts.get(stage, 0) for stage in CLOSED_STAGES)
+        return progress
+
+    def _advance(self, stage, rows=1):
+        # Called as each row reaches a stage during run(), so progress moves row by row
+        if self._progress is None or stage not in self._progress:
+            return
+        self._progress[stage] += rows
+        if self._progress_callback:
+            self._progress_callback(dict(self._progress))
+
+    def _unfinished_chunks(self):
+        """
+        Yield the unfinished rows in row order, JOB_CHUNK at a time
+        """
+        conn = self._connect()
+        last = 0
+        open_stages = [PENDING, RENDERED, PINNED, SUBMITTED] if self.anchor_on_chain else [PENDING]
+        placeholders = ", ".join("?" * len(open_stages))
+        while True:
+            chunk = conn.execute(
+                f"SELECT row_number, uid, candidate_name, course_name, stage, ipfs_hash, certificate_id, merkle_proof "
+                f"FROM rows "
+                f"WHERE row_number > ? AND stage IN ({placeholders}) ORDER BY row_number LIMIT ?",
+                (last, *open_stages, JOB_CHUNK)
+            ).fetchall()
+            if not chunk:
+                return
+            yield [
+                {'row_number': r[0], 'uid': r[1], 'candidate_name': r[2], 'course_name': r[3],
+                 'stage': r[4], 'ipfs_hash': r[5], 'certificate_id': r[6],
+                 'merkle_proof': json.loads(r[7]) if r[7] else None}
+                for r in chunk
+            ]
+            last = chunk[-1][0]
+
+    def run(self, progress_callback=None):
+        """
+        Bring every unfinished row as far as it will go.
+        progress_callback: Optional callable(progress), called with a progress()
+        dict each time a row is rendered, pinned or confirmed
+        Returns counts().
+        """
+        self.ingest()
+        self._open_zip()
+        try:
+            self._restore_zip_entries()
+            self._progress = self.progress()
+            self._progress_callback = progress_callback
+            if progress_callback:
+                progress_callback(dict(self._progress))
+            merkle = self.anchor_on_chain and self.anchor_mode == ANCHOR_MERKLE
+            while True:
+                for chunk in self._unfinished_chunks():
+                    rendered = self._render_chunk(chunk)
+                    if self.anchor_on_chain:
+                        # Pinning consumes rows as they render, so uploads overlap the rest of the chunk's rendering
+                        self._store_chunk(rendered)
+                        if not merkle:
+                            self._anchor_chunk(chunk)
+                    else:
+                        for _ in rendered:
+                            pass
+                if not merkle or not self._merkle_retry_needed():
+                    break
+            if merkle:
+                self._anchor_merkle_root()
+        finally:
+            self._close_zip()
+            self._progress = self._progress_callback = None
+        if self.is_complete() and 'completed_at' not in self.settings:
+            self.settings['completed_at'] = time.time()
+            self._save_settings()
+        return self.counts()
+
+    def _merkle_retry_needed(self):
+        """
+        Whether another pass is needed before a Merkle batch's root can be anchored:
+        rows to retry rendering, or a tree rebuilt without rows that kept failing
+        """
+        if self._exclude_failed_rows():
+            # Every row goes back through rendering with its new proof
+            self._progress = self.progress()
+            if self._progress_callback:
+                self._progress_callback(dict(self._progress))
+            return True
+        return self._connect().execute(
+            "SELECT COUNT(*) FROM rows WHERE stage = ? AND attempts BETWEEN 1 AND ?", (PENDING, MAX_RENDER_ATTEMPTS - 1)
+        ).fetchone()[0] > 0
+
+    def _render_chunk(self, chunk):
+        """
+        Render the chunk's pending rows, adding each to certificates.zip and
+        journaling it as it finishes, and yield every row that is now rendered
+        (freshly or by an earlier run) in row order as a storage result
+        """
+        to_render = [row for row in chunk if row['stage'] == PENDING]
+        results = iter_bulk_certificates(
+            to_render, None, self.org_name, LOGO_PATH, max_workers=RENDER_WORKERS, worker_niceness=RENDER_NICENESS
+        )
+        rendering = {row['row_number'] for row in to_render}
+        for row in chunk:
+            if row['row_number'] in rendering:
+                result = next(results)
+                if result['status'] != 'success':
+                    with self._connect() as conn:
+                        conn.execute(
+                            "UPDATE rows SET error = ?, attempts = attempts + 1 WHERE row_number = ?",
+                            (result['error'], row['row_number'])
+                        )
+                    continue
+                # Into the ZIP before the journal, so a row journaled as rendered always has its entry
+                self._add_to_zip(row['row_number'], row['uid'], row['candidate_name'], result['pdf_bytes'])
+                self._update(row['row_number'], stage=RENDERED, error=None)
+                row['stage'] = RENDERED
+                self._advance(RENDERED)
+                yield {'status': 'success', 'row': row, 'pdf_bytes': result['pdf_bytes'],
+                       'file_name': result['file_name'], 'file_path': None}
+            elif row['stage'] == RENDERED:
+                # Rendered by an earlier run but not stored yet
+                info = self._zip_index[row['row_number']]
+                yield {'status': 'success', 'row': row, 'pdf_bytes': self._zip.read(info),
+                       'file_name': info.filename, 'file_path': None}
+
+    def _store_chunk(self, rendered):
+        """
+        Store rendered rows (from _render_chunk) as they arrive and journal each one as it is stored
+        """
+        for result in store_bulk_certificates(rendered, get_storage()):
+            row = result['row']
+            # Drop the PDF as soon as it is stored, so only the upload window is held in memory
+            result.pop('pdf_bytes', None)
+            if result['ipfs_hash'] is None:
+                self._update(row['row_number'], error="Failed to store certificate")
+                continue
+            self._update(row['row_number'], stage=PINNED, ipfs_hash=result['ipfs_hash'], error=None)
+            row['stage'], row['ipfs_hash'] = PINNED, result['ipfs_hash']
+            self._advance(PINNED)
+
+    def _anchor_chunk(self, chunk):
+        # Imported here so jobs that only render never load web3
+        from utils.chain_utils import issue_certificates_batch
+        to_anchor = [row for row in chunk if row['stage'] in (PINNED, SUBMITTED)]
+        if not to_anchor:
+            return
+        records = []
+        with self._connect() as conn:
+            for row in to_anchor:
+                # Journaled at creation; only jobs created before ids were journaled compute it here
+                certificate_id = row['certificate_id'] or compute_certificate_id(
+                    row['uid'], row['candidate_name'], row['course_name'], self.org_name
+                )
+                records.append({
+                    'certificate_id': certificate_id,
+                    'uid': row['uid'],
+                    'candidate_name': row['candidate_name'],
+                    'course_name': row['course_name'],
+                    'org_name': self.org_name,
+                    'ipfs_hash': row['ipfs_hash'],
+                })
+                conn.execute(
+                    "UPDATE rows SET stage = ?, certificate_id = ? WHERE row_number = ?",
+                    (SUBMITTED, certificate_id, row['row_number'])
+                )
+
+        try:
+            anchored = issue_certificates_batch(records)
+        except Exception as e:
+            # Node unreachable: the rows stay 'submitted' and are re-checked on resume
+            for row in to_anchor:
+                self._update(row['row_number'], error=str(e))
+            return
+
+        with self._connect() as conn:
+            for row, outcome in zip(to_anchor, anchored):
+                if outcome['status'] in ('confirmed', 'exists'):
+                    # 'exists': already on chain, e.g. anchored by an earlier, interrupted run of this job
+                    stage, error = CONFIRMED, None
+                elif outcome['status'] == 'duplicate':
+                    stage, error = DUPLICATE, "Same certificate appears earlier in this job"
+                else:
+                    stage, error = SUBMITTED, outcome.get('error') or f"transaction {outcome['status']}"
+                conn.execute(
+                    "UPDATE rows SET stage = ?, error = ?, tx_hash = COALESCE(?, tx_hash) WHERE row_number = ?",
+                    (stage, error, outcome['tx_hash'], row['row_number'])
+                )
+        self._advance(CONFIRMED, sum(outcome['status'] in ('confirmed', 'exists') for outcome in anchored))
+
+    def _anchor_merkle_root(self):
+        """
+        Anchor the batch's Merkle root in one transaction once every certificate
+        in its tree has rendered with its proof, then confirm the pinned ones.
+        Rows still to be pinned are confirmed by a later run once they are stored;
+        only the root is on chain, so pinning has no bearing on their proofs.
+        """
+        # Imported here so jobs that only render never load web3
+        from utils.chain_utils import anchor_merkle_batch
+        conn = self._connect()
+        if not self.settings.get('merkle_root'):
+            return
+        waiting = conn.execute(
+            "SELECT COUNT(*) FROM rows WHERE stage = ? AND merkle_proof IS NOT NULL", (PENDING,)
+        ).fetchone()[0]
+        if waiting:
+            return
+        if not self.settings.get('merkle_anchored'):
+            try:
+                outcome = anchor_merkle_batch(self.settings['merkle_root'], self.settings['merkle_size'])
+            except Exception as e:
+                outcome = {'status': 'error', 'tx_hash': None, 'error': str(e)}
+            if outcome['status'] not in ('confirmed', 'exists'):
+                # The rows stay 'pinned', so resuming the job tries the root again
+                with conn:
+                    conn.execute(
+                        "UPDATE rows SET error = ? WHERE stage = ?",
+                        (outcome.get('error') or f"transaction {outcome['status']}", PINNED)
+                    )
+                return
+            # 'exists': anchored by an earlier, interrupted run of this job
+            self._index_batch_members()
+            self.settings['merkle_anchored'] = True
+            if outcome['tx_hash']:
+                self.settings['merkle_tx_hash'] = outcome['tx_hash']
+            self._save_settings()
+        with conn:
+            confirmed = conn.execute(
+                "UPDATE rows SET stage = ?, error = NULL, tx_hash = ? WHERE stage = ?",
+                (CONFIRMED, self.settings.get('merkle_tx_hash'), PINNED)
+            ).rowcount
+        self._advance(CONFIRMED, confirmed)
+
+    def _index_batch_members(self):
+        # Lets the verifier recognise these ids, which are not on chain one by one
+        from utils.cert_index import get_certificate_index
+        certificate_ids = [row[0] for row in self._connect().execute(
+            "SELECT certificate_id FROM rows WHERE merkle_proof IS NOT NULL AND stage != ?", (EXCLUDED,)
+        )]
+        try:
+            get_certificate_index().add_batch_members(self.settings['merkle_root'], certificate_ids)
+        except sqlite3.Error as e:
+            print(f"Error recording batch in certificate index: {e}")
+
+    def artifact_path(self, name):
+        """
+        Path of a download artifact (e.g. results.csv) kept in the job directory
+        """
+        return os.path.join(self.directory, name)
+
+    def export_results(self, path=None):
+        """
+        Write the journal to a CSV at path (a temp file by default) and return its path
+        """
+        out = _open_export(path, "results-", ".csv", "w", newline='')
+        with out:
+            writer = csv.writer(out)
+            writer.writerow(RESULT_FIELDS)
+            writer.writerows(self._connect().execute(f"SELECT {', '.join(RESULT_FIELDS)} FROM rows ORDER BY row_number"))
+        return _finish_export(out.name, path)
+
+    def export_zip(self):
+        """
+        Finish certificates.zip (STORED, as PDFs are already compressed), which
+        run() fills as rows render, and return its path. Missing rows are restored;
+        entries superseded by a later render (a Merkle tree rebuild) or for rows
+        not issued are dropped, which is the only time the ZIP is rewritten.
+        """
+        path = self.artifact_path("certificates.zip")
+        compacted = None
+        zipf = self._open_zip()
+        try:
+            self._restore_zip_entries()
+            issued = {row[0] for row in self._connect().execute(
+                "SELECT row_number FROM rows WHERE stage IN (?, ?, ?, ?)", (RENDERED, PINNED, SUBMITTED, CONFIRMED)
+            )}
+            keep = [self._zip_index[row_number] for row_number in sorted(issued) if row_number in self._zip_index]
+            if len(keep) != len(zipf.infolist()):
+                compacted = _open_export(path, "certificates-", ".zip", "wb")
+                with compacted, zipfile.ZipFile(compacted, 'w', compression=zipfile.ZIP_STORED) as out:
+                    for info in keep:
+                        out.writestr(info, zipf.read(info))
+        finally:
+            self._close_zip()
+        if compacted is not None:
+            _finish_export(compacted.name, path)
+        return path
+
+    def delete(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def _open_export(path, prefix, suffix, mode, **kwargs):
+    # Exports into the job directory go through a temp file there, so readers never see a partial artifact
+    directory = os.path.dirname(path) if path else None
+    return tempfile.NamedTemporaryFile(mode, prefix=prefix, suffix=suffix, dir=directory, delete=False, **kwargs)
+
+
+def _finish_export(tmp_path, path):
+    if path is None:
+        return tmp_path
+    os.replace(tmp_path, path)
+    return path
+
+
+def _invalid_rows(invalid):
+    rows = [
+        (row_number, row.get('uid'), row.get('candidate_name'), row.get('course_name'), INVALID, ', '.join(errors),
+         row.get('certificate_id'))
+        for row_number, row, errors in invalid
+    ]
+    invalid.clear()
+    return rows
+
+
+def purge_expired_jobs(retention_days=JOB_RETENTION_DAYS):
+    """
+    Delete jobs that completed more than retention_days ago. Unfinished jobs are
+    kept, as they can still be resumed. Returns the ids of the deleted jobs.
+    """
+    cutoff = time.time() - retention_days * 86400
+    purged = []
+    for job_id in list_jobs():
+        directory = os.path.join(JOBS_DIR, job_id)
+        try:
+            with open(os.path.join(directory, "job.json"), "r") as f:
+                completed_at = json.load(f).get('completed_at')
+        except (OSError, ValueError):
+            # Deleted meanwhile, or job.json is being rewritten
+            continue
+        if completed_at is not None and completed_at < cutoff:
+            shutil.rmtree(directory, ignore_errors=True)
+            purged.append(job_id)
+    return purged
+
+
+def list_unfinished_jobs():
+    """
+    Return the ids of jobs that still have work left, newest first. Only job.json
+    is read, so this is cheap enough for every page refresh; jobs deleted
+    meanwhile are skipped.
+    """
+    unfinished = []
+    for job_id in list_jobs():
+        try:
+            with open(os.path.join(JOBS_DIR, job_id, "job.json"), "r") as f:
+                settings = json.load(f)
+            if 'completed_at' in settings:
+                continue
+            if 'ingested' not in settings:
+                # A job from before completion was recorded in job.json: ask its journal and remember the answer
+                job = BulkJob(job_id)
+                if job.is_complete():
+                    job.settings['completed_at'] = time.time()
+                    job._save_settings()
+                    continue
+        except (OSError, ValueError, sqlite3.Error):
+            continue
+        unfinished.append(job_id)
+    return unfinished
+
+
+def list_jobs():
+    """
+    Return the ids of all jobs on disk, newest first
+    """
+    if not os.path.isdir(JOBS_DIR):
+        return []
+    return sorted(
+        (name for name in os.listdir(JOBS_DIR) if os.path.exists(os.path.join(JOBS_DIR, name, "job.json"))),
+        reverse=True
+    )
@@ -0,0 +1,275 @@
+import os
+import sqlite3
+import sys
+import threading
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from connection import get_contract, get_w3
+from utils.chain_utils import get_certificates
+
+INDEX_PATH = os.getenv(
+    "CERT_INDEX_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "certificate_index.db")
+)
+# Blocks to stay behind the head; 0 indexes up to the latest block
+CONFIRMATIONS = int(os.getenv("CERT_INDEX_CONFIRMATIONS", "0"))
+# Recent block hashes kept for reorg detection
+REORG_WINDOW = 64
+# Block range requested per getLogs call
+LOG_CHUNK = 2000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS certificates (
+    certificate_id TEXT PRIMARY KEY,
+    uid TEXT,
+    candidate_name TEXT,
+    course_name TEXT,
+    org_name TEXT,
+    ipfs_hash TEXT,
+    block_number INTEGER NOT NULL,
+    tx_hash TEXT
+);
+CREATE INDEX IF NOT EXISTS certificates_block ON certificates (block_number);
+CREATE TABLE IF NOT EXISTS blocks (
+    number INTEGER PRIMARY KEY,
+    hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS batch_members (
+    certificate_id TEXT PRIMARY KEY,
+    merkle_root TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class CertificateIndex:
+    """
+    Local SQLite index of issued certificates built from certificateGenerated events.
+    sync() tails new events from the stored block cursor and rolls back blocks
+    that were reorganised away; get() answers lookups without touching the chain.
+    Certificates anchored as part of a Merkle batch are not on chain one by one;
+    bulk jobs record them with add_batch_members() so batch_root() can find them.
+    """
+
+    def __init__(self, path=INDEX_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._sync_lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            address = conn.execute("SELECT value FROM meta WHERE key = 'contract'").fetchone()
+            if address is None or address[0] != get_contract().address:
+                # Redeployed contract: everything indexed so far belongs to the old one
+                self._reset(conn)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _reset(self, conn):
+        conn.execute("DELETE FROM certificates")
+        conn.execute("DELETE FROM blocks")
+        conn.execute("DELETE FROM batch_members")
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('contract', ?)", (get_contract().address,))
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('cursor', '-1')")
+
+    def cursor(self):
+        """
+        Last block whose events are fully indexed (-1 before the first sync)
+        """
+        row = self._connect().execute("SELECT value FROM meta WHERE key = 'cursor'").fetchone()
+        return int(row[0]) if row else -1
+
+    def get(self, certificate_id):
+        """
+        Return (uid, candidate_name, course_name, org_name, ipfs_hash) or None
+        """
+        row = self._connect().execute(
+            "SELECT uid, candidate_name, course_name, org_name, ipfs_hash FROM certificates WHERE certificate_id = ?",
+            (certificate_id,)
+        ).fetchone()
+        return tuple(row) if row else None
+
+    def get_many(self, certificate_ids):
+        """
+        Return {certificate_id: record} for the ids present in the index
+        """
+        conn = self._connect()
+        found = {}
+        certificate_ids = list(certificate_ids)
+        for i in range(0, len(certificate_ids), 500):  # stay under SQLite's bound-parameter limit
+            chunk = certificate_ids[i:i + 500]
+            rows = conn.execute(
+                "SELECT certificate_id, uid, candidate_name, course_name, org_name, ipfs_hash FROM certificates "
+                f"WHERE certificate_id IN ({','.join('?' * len(chunk))})",
+                chunk
+            ).fetchall()
+            found.update((row[0], tuple(row[1:])) for row in rows)
+        return found
+
+    def add_batch_members(self, merkle_root, certificate_ids):
+        """
+        Record the certificates of an anchored Merkle batch
+        """
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO batch_members (certificate_id, merkle_root) VALUES (?, ?)",
+                ((certificate_id, merkle_root) for certificate_id in certificate_ids)
+            )
+
+    def batch_root(self, certificate_id):
+        """
+        Return the Merkle root of the batch certificate_id was anchored in, or None
+        """
+        row = self._connect().execute(
+            "SELECT merkle_root FROM batch_members WHERE certificate_id = ?", (certificate_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def batch_roots(self, certificate_ids):
+        """
+        Return {certificate_id: merkle_root} for the ids anchored in a Merkle batch
+        """
+        conn = self._connect()
+        found = {}
+        certificate_ids = list(certificate_ids)
+        for i in range(0, len(certificate_ids), 500):  # stay under SQLite's bound-parameter limit
+            chunk = certificate_ids[i:i + 500]
+            found.update(conn.execute(
+                f"SELECT certificate_id, merkle_root FROM batch_members WHERE certificate_id IN ({','.join('?' * len(chunk))})",
+                chunk
+            ).fetchall())
+        return found
+
+    def count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM certificates").fetchone()[0]
+
+    def _rollback_reorg(self, conn):
+        """
+        Find the newest tracked block still on the canonical chain and drop everything after it
+        """
+        tracked = conn.execute("SELECT number, hash FROM blocks ORDER BY number DESC").fetchall()
+        if not tracked:
+            return
+        ancestor = None
+        for number, block_hash in tracked:
+            try:
+                canonical = get_w3().eth.get_block(number)['hash'].hex()
+            except Exception:
+                continue  # Chain is now shorter than this block
+            if canonical == block_hash:
+                ancestor = number
+                break
+        if ancestor == tracked[0][0]:
+            return
+        if ancestor is None:
+            # Reorg deeper than the tracked window (or a fresh dev chain): rebuild from scratch
+            print("Certificate index no longer matches the chain, rebuilding it", file=sys.stderr)
+            self._reset(conn)
+            return
+
+        print(f"Chain reorganisation detected, rolling certificate index back to block {ancestor}", file=sys.stderr)
+        conn.execute("DELETE FROM certificates WHERE block_number > ?", (ancestor,))
+        conn.execute("DELETE FROM blocks WHERE number > ?", (ancestor,))
+        conn.execute("UPDATE meta SET value = ? WHERE key = 'cursor'", (str(ancestor),))
+
+    def sync(self):
+        """
+        Index every certificateGenerated event since the cursor.
+        Returns the number of certificates added.
+        """
+        w3 = get_w3()
+        contract = get_contract()
+        with self._sync_lock:
+            conn = self._connect()
+            with conn:
+                self._rollback_reorg(conn)
+            head = w3.eth.block_number - CONFIRMATIONS
+            start = self.cursor() + 1
+            added = 0
+            while start <= head:
+                end = min(start + LOG_CHUNK - 1, head)
+                logs = contract.events.certificateGenerated.getLogs(fromBlock=start, toBlock=end)
+                rows = []
+                blocks = {end: w3.eth.get_block(end)['hash'].hex()}
+                records = get_certificates([log['args']['certificate_id'] for log in logs])
+                for log, record in zip(logs, records):
+                    if record is None:
+                        print(f"Error resolving certificate {log['args']['certificate_id']}: not found", file=sys.stderr)
+                        continue
+                    rows.append((
+                        log['args']['certificate_id'], *record, log['blockNumber'], log['transactionHash'].hex()
+                    ))
+                    blocks[log['blockNumber']] = log['blockHash'].hex()
+
+                with conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO certificates VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows
+                    )
+                    conn.executemany("INSERT OR REPLACE INTO blocks VALUES (?, ?)", blocks.items())
+                    conn.execute("DELETE FROM blocks WHERE number <= ?", (end - REORG_WINDOW,))
+                    conn.execute("UPDATE meta SET value = ? WHERE key = 'cursor'", (str(end),))
+                added += len(rows)
+                start = end + 1
+            return added
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_certificate_index():
+    """
+    Return the process-wide certificate index
+    """
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = CertificateIndex()
+        return _index
+
+
+def lookup_certificate(certificate_id, use_index=True):
+    """
+    Return (uid, candidate_name, course_name, org_name, ipfs_hash) for an issued
+    certificate, or None. Answers from the local index and falls back to the
+    chain for certificates the index has not seen yet.
+    """
+    if use_index:
+        try:
+            record = get_certificate_index().get(certificate_id)
+            if record is not None:
+                return record
+        except sqlite3.Error as e:
+            print(f"Error reading certificate index: {e}", file=sys.stderr)
+
+    contract = get_contract()
+    if not contract.functions.isVerified(certificate_id).call():
+        return None
+    return tuple(contract.functions.getCertificate(certificate_id).call())
+
+
+def lookup_certificates(certificate_ids, use_index=True):
+    """
+    Batch version of lookup_certificate. Returns a record or None per id, in input
+    order; ids missing from the index are fetched with batched chain reads.
+    """
+    certificate_ids = list(certificate_ids)
+    found = {}
+    if use_index:
+        try:
+            found = get_certificate_index().get_many(certificate_ids)
+        except sqlite3.Error as e:
+            print(f"Error reading certificate index: {e}", file=sys.stderr)
+
+    misses = [certificate_id for certificate_id in certificate_ids if certificate_id not in found]
+    if misses:
+        found.update(zip(misses, get_certificates(misses)))
+    return [found[certificate_id] for certificate_id in certificate_ids]
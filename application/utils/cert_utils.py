@@ -1,169 +1,401 @@
 from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle
+from reportlab.platypus import Paragraph, Spacer, Table, TableStyle, Flowable
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib import colors
 from reportlab.lib.units import inch
 from reportlab.graphics.shapes import Drawing, Rect
 from reportlab.graphics import renderPDF
-import pdfplumber
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+from reportlab import rl_config
+from PIL import Image as PILImage
+import hashlib
+import io
+import json
 import os
+import threading
 from datetime import datetime
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 import re
 
-def generate_certificate(output_path, uid, candidate_name, course_name, org_name, institute_logo_path=None, format_type="PDF"):
+# Write binary PDF streams; ASCII85 only inflates every certificate and costs CPU per render
+rl_config.useA85 = 0
+
+# Marks the JSON stored in a certificate's Keywords entry
+CERTIFICATE_METADATA_SCHEMA = "certificate-validation/1"
+
+# Field length limits enforced by validate_certificate_data and the bulk roster validation
+MAX_UID_LENGTH = 50
+MAX_CANDIDATE_NAME_LENGTH = 100
+MAX_COURSE_NAME_LENGTH = 200
+
+
+class _LogoFlowable(Flowable):
     """
-    Generate a professional certificate with enhanced design
+    Draws an already decoded logo so every certificate shares one image
     """
 
-    doc = SimpleDocTemplate(output_path, pagesize=A4, 
-                          topMargin=1*inch, bottomMargin=1*inch,
-                          leftMargin=1*inch, rightMargin=1*inch)
-    
-    elements = []
-    
-    
-    if institute_logo_path and os.path.exists(institute_logo_path):
+    def __init__(self, image, width, height):
+        Flowable.__init__(self)
+        self.image = image
+        self.width = width
+        self.height = height
+        self.hAlign = 'CENTER'
+
+    def draw(self):
+        self.canv.drawImage(self.image, 0, 0, self.width, self.height)
+
+
+class CertificateTemplate:
+    """
+    Compiled certificate layout for one organization and logo.
+    Styles, the logo and the static flowables (institute name, title and
+    signature block) are built and measured once; render() only lays out
+    the fields that change per certificate.
+    """
+
+    LOGO_SIZE = 120
+    FRAME_PADDING = 6  # platypus Frame default padding
+
+    def __init__(self, org_name, institute_logo_path=None):
+        self.org_name = org_name
+        self.page_width, self.page_height = A4
+        margin = 1*inch
+        self.frame_x = margin + self.FRAME_PADDING
+        self.frame_width = self.page_width - 2*margin - 2*self.FRAME_PADDING
+        self.frame_top = self.page_height - margin - self.FRAME_PADDING
+        self.frame_bottom = margin + self.FRAME_PADDING
+
+        styles = getSampleStyleSheet()
+        institute_style = ParagraphStyle(
+            "InstituteStyle",
+            parent=styles["Title"],
+            fontName="Helvetica-Bold",
+            fontSize=16,
+            textColor=colors.darkblue,
+            spaceAfter=0.15*inch,
+            alignment=1  # Center alignment
+        )
+        title_style = ParagraphStyle(
+            "TitleStyle",
+            parent=styles["Title"],
+            fontName="Helvetica-Bold",
+            fontSize=22,
+            textColor=colors.darkred,
+            spaceAfter=0.2*inch,
+            alignment=1
+        )
+        self.body_style = ParagraphStyle(
+            "BodyStyle",
+            parent=styles["BodyText"],
+            fontSize=13,
+            leading=18,
+            alignment=1,
+            spaceAfter=0.1*inch
+        )
+        self.date_style = ParagraphStyle(
+            "DateStyle",
+            parent=styles["BodyText"],
+            fontSize=10,
+            alignment=1
+        )
+        self.cert_id_style = ParagraphStyle(
+            "CertIdStyle",
+            parent=styles["BodyText"],
+            fontSize=8,
+            textColor=colors.grey,
+            alignment=1
+        )
+
+        header = []
+        logo = self._load_logo(institute_logo_path)
+        if logo is not None:
+            header.extend([_LogoFlowable(logo, self.LOGO_SIZE, self.LOGO_SIZE), Spacer(1, 0.2*inch)])
+        header.extend([
+            Paragraph(f"<b>{org_name}</b>", institute_style), Spacer(1, 0.2*inch),
+            Paragraph("CERTIFICATE OF COMPLETION", title_style), Spacer(1, 0.3*inch),
+        ])
+
+        signature_table = Table([
+            ["", "", ""],
+            ["_________________", "", "_________________"],
+            ["Registrar Signature", "", "Dean Signature"]
+        ], colWidths=[2*inch, 1*inch, 2*inch])
+        signature_table.setStyle(TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('FONTNAME', (0, 1), (-1, 1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 1), (-1, 1), 12),
+        ]))
+
+        # Measure the static flowables once; render() reuses these sizes
+        self.header = self._measure(header)
+        self.body_spacer, self.date_spacer, self.signature_spacer = self._measure(
+            [Spacer(1, 0.15*inch), Spacer(1, 0.08*inch), Spacer(1, 0.08*inch)]
+        )
+        self.signature = self._measure([signature_table])[0]
+
+    @staticmethod
+    def _load_logo(institute_logo_path):
+        """
+        Decode the logo once, flattened onto white and downscaled to twice
+        its printed size, and keep it as JPEG so each PDF embeds it as-is.
+        """
+        if not institute_logo_path or not os.path.exists(institute_logo_path):
+            return None
         try:
-            logo = Image(institute_logo_path, width=120, height=120)
-            elements.append(logo)
-            elements.append(Spacer(1, 0.2*inch))
-        except:
-            pass  # Skip logo if there's an error
-    
-    # Institute name with enhanced styling
-    institute_style = ParagraphStyle(
-        "InstituteStyle",
-        parent=getSampleStyleSheet()["Title"],
-        fontName="Helvetica-Bold",
-        fontSize=16,
-        textColor=colors.darkblue,
-        spaceAfter=0.15*inch,
-        alignment=1  # Center alignment
-    )
-    institute = Paragraph(f"<b>{org_name}</b>", institute_style)
-    elements.extend([institute, Spacer(1, 0.2*inch)])
-    
-    # Certificate title with decorative styling
-    title_style = ParagraphStyle(
-        "TitleStyle",
-        parent=getSampleStyleSheet()["Title"],
-        fontName="Helvetica-Bold",
-        fontSize=22,
-        textColor=colors.darkred,
-        spaceAfter=0.2*inch,
-        alignment=1
-    )
-    title = Paragraph("CERTIFICATE OF COMPLETION", title_style)
-    elements.extend([title, Spacer(1, 0.3*inch)])
-    
-    # Certificate body with professional formatting
-    body_style = ParagraphStyle(
-        "BodyStyle",
-        parent=getSampleStyleSheet()["BodyText"],
-        fontSize=13,
-        leading=18,
-        alignment=1,
-        spaceAfter=0.1*inch
-    )
-    
-    body_text = f"""
-    This is to certify that<br/><br/>
-    <font color='darkblue' size='20'><b>{candidate_name}</b></font><br/><br/>
-    Student ID: <font color='darkred'><b>{uid}</b></font><br/><br/>
-    has successfully completed the course<br/><br/>
-    <font color='darkgreen' size='18'><b>"{course_name}"</b></font><br/><br/>
-    and is hereby awarded this certificate of completion.
+            with PILImage.open(institute_logo_path) as img:
+                img = img.convert("RGBA")
+                flattened = PILImage.new("RGB", img.size, "white")
+                flattened.paste(img, mask=img.getchannel("A"))
+            size = 2 * CertificateTemplate.LOGO_SIZE
+            flattened.thumbnail((size, size))
+            buffer = io.BytesIO()
+            flattened.save(buffer, format="JPEG", quality=90)
+            buffer.seek(0)
+            return ImageReader(buffer)
+        except Exception:
+            return None  # Skip logo if there's an error
+
+    def _measure(self, flowables):
+        return [(f, f.wrap(self.frame_width, self.frame_top - self.frame_bottom)) for f in flowables]
+
+    def _stack(self, canv, items, y, prev_after, at_top=False):
+        """
+        Place flowables top-down the same way a platypus Frame does
+        """
+        for flowable, size in items:
+            w, h = size or flowable.wrap(self.frame_width, y - self.frame_bottom)
+            before = 0 if at_top else max(flowable.getSpaceBefore() - prev_after, 0)
+            at_top = False
+            y -= before + h
+            flowable.drawOn(canv, self.frame_x, y, _sW=self.frame_width - w)
+            prev_after = flowable.getSpaceAfter()
+            y -= prev_after
+        return y, prev_after
+
+    def render(self, output_path, uid, candidate_name, course_name, certificate_id=None, merkle_proof=None):
+        """
+        Render one certificate to output_path (a file name or binary file object).
+        The on-chain certificate ID and the structured fields are embedded in the
+        document info so verifiers can skip text extraction.
+        merkle_proof: {'root', 'proof'} for certificates anchored as a Merkle batch
+        """
+        if certificate_id is None:
+            certificate_id = compute_certificate_id(uid, candidate_name, course_name, self.org_name)
+        body_text = f"""
+        This is to certify that<br/><br/>
+        <font color='darkblue' size='20'><b>{candidate_name}</b></font><br/><br/>
+        Student ID: <font color='darkred'><b>{uid}</b></font><br/><br/>
+        has successfully completed the course<br/><br/>
+        <font color='darkgreen' size='18'><b>"{course_name}"</b></font><br/><br/>
+        and is hereby awarded this certificate of completion.
+        """
+        current_date = datetime.now().strftime("%B %d, %Y")
+        date_text = f"Date of Issue: {current_date}"
+        cert_id_text = f"Certificate ID: {uid}_{candidate_name.replace(' ', '_')}_{current_date.replace(' ', '_')}"
+
+        items = list(self.header)
+        items.extend([
+            (Paragraph(body_text, self.body_style), None), self.body_spacer,
+            (Paragraph(date_text, self.date_style), None), self.date_spacer,
+            self.signature, self.signature_spacer,
+            (Paragraph(cert_id_text, self.cert_id_style), None),
+        ])
+
+        # invariant: no timestamp or random document ID, so the same certificate always
+        # renders to the same bytes (and therefore the same IPFS CID)
+        canv = canvas.Canvas(output_path, pagesize=A4, invariant=1)
+        canv.setTitle(f"Certificate of Completion - {candidate_name}")
+        canv.setAuthor(self.org_name)
+        canv.setSubject(certificate_id)
+        metadata = {
+            'schema': CERTIFICATE_METADATA_SCHEMA,
+            'certificate_id': certificate_id,
+            'uid': str(uid),
+            'candidate_name': candidate_name,
+            'course_name': course_name,
+            'org_name': self.org_name,
+            'issue_date': current_date,
+        }
+        if merkle_proof is not None:
+            metadata['merkle'] = merkle_proof
+        canv.setKeywords(json.dumps(metadata))
+        self._stack(canv, items, self.frame_top, 0, at_top=True)
+        canv.showPage()
+        canv.save()
+
+
+_template_cache = threading.local()
+
+
+def get_certificate_template(org_name, institute_logo_path=None):
     """
-    
-    body = Paragraph(body_text, body_style)
-    elements.extend([body, Spacer(1, 0.15*inch)])
-    
-    # Add date and signature section
-    date_style = ParagraphStyle(
-        "DateStyle",
-        parent=getSampleStyleSheet()["BodyText"],
-        fontSize=10,
-        alignment=1
-    )
-    
-    current_date = datetime.now().strftime("%B %d, %Y")
-    date_text = f"Date of Issue: {current_date}"
-    date_para = Paragraph(date_text, date_style)
-    elements.extend([date_para, Spacer(1, 0.08*inch)])
-    
-    # Signature section
-    signature_table_data = [
-        ["", "", ""],
-        ["_________________", "", "_________________"],
-        ["Registrar Signature", "", "Dean Signature"]
-    ]
-    
-    signature_table = Table(signature_table_data, colWidths=[2*inch, 1*inch, 2*inch])
-    signature_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('FONTNAME', (0, 1), (-1, 1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 1), (-1, 1), 12),
-    ]))
-    
-    elements.append(signature_table)
-    elements.append(Spacer(1, 0.08*inch))
-    
-    # Add certificate ID at the bottom
-    cert_id_style = ParagraphStyle(
-        "CertIdStyle",
-        parent=getSampleStyleSheet()["BodyText"],
-        fontSize=8,
-        textColor=colors.grey,
-        alignment=1
-    )
-    
-    cert_id_text = f"Certificate ID: {uid}_{candidate_name.replace(' ', '_')}_{current_date.replace(' ', '_')}"
-    cert_id_para = Paragraph(cert_id_text, cert_id_style)
-    elements.append(cert_id_para)
-    
-    # Build the PDF document
-    doc.build(elements)
+    Return the compiled template for this organization and logo.
+    Templates are cached per thread since flowables are not safe to draw
+    from several threads at once.
+    """
+    templates = getattr(_template_cache, "templates", None)
+    if templates is None:
+        templates = _template_cache.templates = {}
+    key = (org_name, institute_logo_path)
+    template = templates.get(key)
+    if template is None:
+        if len(templates) >= 8:
+            templates.clear()
+        template = templates[key] = CertificateTemplate(org_name, institute_logo_path)
+    return template
+
+
+def generate_certificate(output_path, uid, candidate_name, course_name, org_name, institute_logo_path=None, format_type="PDF",
+                         certificate_id=None, merkle_proof=None):
+    """
+    Generate a professional certificate with enhanced design
+    certificate_id: ID embedded in the PDF metadata; defaults to compute_certificate_id of the fields
+    merkle_proof: {'root', 'proof'} embedded for certificates anchored as a Merkle batch
+    """
+    template = get_certificate_template(org_name, institute_logo_path)
+    template.render(output_path, uid, candidate_name, course_name, certificate_id, merkle_proof)
     print(f"Certificate generated and saved at: {output_path}")
 
 
-def generate_bulk_certificates(certificates_data, output_dir, org_name, institute_logo_path=None):
+def _render_bulk_row(index, cert_data, output_dir, org_name, institute_logo_path):
+    """
+    Render a single bulk row and return its result dict.
+    Runs inside pool workers, so any error is captured here and reported
+    for this row only instead of propagating into the worker.
+    """
+    try:
+        uid = cert_data.get('uid', f'STU{index+1:03d}')
+        candidate_name = cert_data.get('candidate_name', 'Unknown Student')
+        course_name = cert_data.get('course_name', 'General Course')
+        
+        file_name = f"certificate_{uid}_{candidate_name.replace(' ', '_')}.pdf"
+        
+        if output_dir is None:
+            # Hand the PDF back in memory, e.g. to be streamed straight into a ZIP
+            buffer = io.BytesIO()
+            get_certificate_template(org_name, institute_logo_path).render(
+                buffer, uid, candidate_name, course_name,
+                cert_data.get('certificate_id'), cert_data.get('merkle_proof')
+            )
+            output_path, pdf_bytes = None, buffer.getvalue()
+        else:
+            output_path = os.path.join(output_dir, file_name)
+            generate_certificate(output_path, uid, candidate_name, course_name, org_name, institute_logo_path,
+                                 certificate_id=cert_data.get('certificate_id'),
+                                 merkle_proof=cert_data.get('merkle_proof'))
+            pdf_bytes = None
+        
+        return {
+            'uid': uid,
+            'candidate_name': candidate_name,
+            'course_name': course_name,
+            'file_name': file_name,
+            'file_path': output_path,
+            'pdf_bytes': pdf_bytes,
+            'status': 'success'
+        }
+        
+    except Exception as e:
+        return _failed_bulk_row(index, cert_data, e)
+
+
+def _failed_bulk_row(index, cert_data, error):
+    return {
+        'uid': cert_data.get('uid', f'STU{index+1:03d}'),
+        'candidate_name': cert_data.get('candidate_name', 'Unknown Student'),
+        'course_name': cert_data.get('course_name', 'General Course'),
+        'file_name': None,
+        'file_path': None,
+        'pdf_bytes': None,
+        'status': 'error',
+        'error': str(error)
+    }
+
+
+def iter_bulk_certificates(certificates_data, output_dir, org_name, institute_logo_path=None,
+                           max_workers=1, progress_callback=None, total=None, worker_niceness=0):
+    """
+    Render certificates_data like generate_bulk_certificates, but yield each result
+    in input order as soon as it and every row before it have rendered, so later
+    stages (e.g. IPFS pinning) can start while the rest of the batch is still rendering.
+    With output_dir=None nothing is written to disk and each successful result
+    carries the rendered PDF in 'pdf_bytes' instead of a 'file_path'.
+    certificates_data may be any iterable, such as a streamed CSV: rows are only
+    pulled as the window frees up, with at most a few rows per worker queued
+    ahead of the consumer, so memory stays flat however long the roster is.
+    total: row count reported to progress_callback when certificates_data has no len()
+    worker_niceness: Added to the nice value of the render processes, so background
+    batches yield the CPU to interactive requests
+    """
+    if total is None and hasattr(certificates_data, '__len__'):
+        total = len(certificates_data)
+
+    if max_workers is None or max_workers <= 1 or (total is not None and total <= 1):
+        for i, cert_data in enumerate(certificates_data):
+            result = _render_bulk_row(i, cert_data, output_dir, org_name, institute_logo_path)
+            if progress_callback:
+                progress_callback(i + 1, total)
+            yield result
+        return
+
+    window = max_workers * 4
+    completed = 0
+    with ProcessPoolExecutor(
+        max_workers=max_workers if total is None else min(max_workers, total),
+        initializer=_lower_priority if worker_niceness else None,
+        initargs=(worker_niceness,)
+    ) as executor:
+        rows = enumerate(certificates_data)
+        pending = deque()
+        not_done = set()
+        while True:
+            # Keep the window full, in input order
+            while len(pending) < window:
+                row = next(rows, None)
+                if row is None:
+                    break
+                i, cert_data = row
+                future = executor.submit(_render_bulk_row, i, cert_data, output_dir, org_name, institute_logo_path)
+                pending.append((i, cert_data, future))
+                not_done.add(future)
+            if not pending:
+                break
+
+            finished, not_done = wait(not_done, return_when=FIRST_COMPLETED)
+            completed += len(finished)
+            if progress_callback:
+                progress_callback(completed, total)
+
+            while pending and pending[0][2].done():
+                i, cert_data, future = pending.popleft()
+                try:
+                    yield future.result()
+                except Exception as e:
+                    # The worker process itself died (e.g. BrokenProcessPool)
+                    yield _failed_bulk_row(i, cert_data, e)
+
+
+def _lower_priority(niceness):
+    if hasattr(os, "nice"):
+        os.nice(niceness)
+
+
+def generate_bulk_certificates(certificates_data, output_dir, org_name, institute_logo_path=None,
+                               max_workers=1, progress_callback=None):
     """
     Generate multiple certificates from a list of student data
     certificates_data: List of dictionaries with keys: uid, candidate_name, course_name
+    max_workers: Number of rendering processes; 1 renders inline on the calling process
+    progress_callback: Optional callable(completed, total) invoked after every certificate
+    Results are returned in the same order as certificates_data.
     """
-    generated_certificates = []
-    
-    for i, cert_data in enumerate(certificates_data):
-        try:
-            uid = cert_data.get('uid', f'STU{i+1:03d}')
-            candidate_name = cert_data.get('candidate_name', 'Unknown Student')
-            course_name = cert_data.get('course_name', 'General Course')
-            
-            output_path = os.path.join(output_dir, f"certificate_{uid}_{candidate_name.replace(' ', '_')}.pdf")
-            
-            generate_certificate(output_path, uid, candidate_name, course_name, org_name, institute_logo_path)
-            
-            generated_certificates.append({
-                'uid': uid,
-                'candidate_name': candidate_name,
-                'course_name': course_name,
-                'file_path': output_path,
-                'status': 'success'
-            })
-            
-        except Exception as e:
-            generated_certificates.append({
-                'uid': cert_data.get('uid', f'STU{i+1:03d}'),
-                'candidate_name': cert_data.get('candidate_name', 'Unknown Student'),
-                'course_name': cert_data.get('course_name', 'General Course'),
-                'file_path': None,
-                'status': 'error',
-                'error': str(e)
-            })
-    
-    return generated_certificates
+    return list(iter_bulk_certificates(
+        certificates_data, output_dir, org_name, institute_logo_path, max_workers, progress_callback
+    ))
 
 
 def validate_certificate_data(uid, candidate_name, course_name, org_name):
@@ -185,107 +417,237 @@ def validate_certificate_data(uid, candidate_name, course_name, org_name):
         errors.append("Organization name is required")
     
     # Additional validations
-    if len(uid) > 50:
-        errors.append("UID is too long (max 50 characters)")
+    if len(uid) > MAX_UID_LENGTH:
+        errors.append(f"UID is too long (max {MAX_UID_LENGTH} characters)")
     
-    if len(candidate_name) > 100:
-        errors.append("Candidate name is too long (max 100 characters)")
+    if len(candidate_name) > MAX_CANDIDATE_NAME_LENGTH:
+        errors.append(f"Candidate name is too long (max {MAX_CANDIDATE_NAME_LENGTH} characters)")
     
-    if len(course_name) > 200:
-        errors.append("Course name is too long (max 200 characters)")
+    if len(course_name) > MAX_COURSE_NAME_LENGTH:
+        errors.append(f"Course name is too long (max {MAX_COURSE_NAME_LENGTH} characters)")
     
     return errors
 
 
-def extract_certificate(pdf_path):
+def compute_certificate_id(uid, candidate_name, course_name, org_name):
+    """
+    Compute the SHA-256 certificate ID that is stored on-chain
+    """
+    data_to_hash = f"{uid}{candidate_name}{course_name}{org_name}".encode('utf-8')
+    return hashlib.sha256(data_to_hash).hexdigest()
+
+
+def compute_certificate_ids(uids, candidate_names, course_names, org_name):
     """
-    Extract certificate data from PDF file
+    compute_certificate_id over whole columns in one pass; returns the ids in input order
+    """
+    sha256 = hashlib.sha256
+    keys = (f"{uid}{candidate_name}{course_name}{org_name}" for uid, candidate_name, course_name
+            in zip(uids, candidate_names, course_names))
+    return [sha256(data).hexdigest() for data in map(str.encode, keys)]
+
+
+def open_pdf_source(pdf_source):
+    """
+    Return something pdfplumber can open: a path or file object as-is,
+    in-memory bytes (bytes, bytearray, memoryview) wrapped without touching disk
+    """
+    if isinstance(pdf_source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(pdf_source)
+    return pdf_source
+
+
+def _load_certificate_metadata(pdf):
+    """
+    Return the metadata dict written by generate_certificate, or None for legacy PDFs
     """
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            # Extract text from each page
-            text = ""
-            for page in pdf.pages:
-                text += page.extract_text()
-            
-            if not text:
-                return None, None, None, None, None
-            
-            lines = [line.strip() for line in text.splitlines() if line.strip()]
-            
-            if len(lines) < 4:
-                return None, None, None, None, None
-                
-            # Initialize defaults
-            org_name = lines[0] if lines else "Unknown Organization"
-            candidate_name = None
-            uid = None
-            course_name = None
-
-            # helper to get next non-empty line
-            def next_nonempty(idx):
-                for j in range(idx + 1, len(lines)):
-                    if lines[j].strip():
-                        return lines[j].strip()
-                return ""
-
-            # Search lines for UID, candidate name, and course
-            for idx, line in enumerate(lines):
-                l = line
-                if "Student ID:" in l:
-                    uid = l.split("Student ID:")[-1].strip()
-
-                if "This is to certify that" in l and idx + 1 < len(lines):
-                    candidate_name = next_nonempty(idx)
-
-                if "has successfully completed" in l or "completed the course" in l:
-                    # Try to capture quoted course on same line
-                    m = re.search(r'"([^"]+)"', l)
-                    if m:
-                        course_name = m.group(1).strip()
-                    else:
-                        # fallback to next non-empty line
-                        nxt = next_nonempty(idx)
-                        if nxt:
-                            course_name = nxt.strip().strip('"')
-
-            # Final fallbacks
-            if not candidate_name:
-                candidate_name = "Unknown Student"
-            if not uid:
-                uid = "Unknown UID"
-            if not course_name:
-                # try to find any quoted substring in full text
-                mq = re.search(r'"([^"]{2,200})"', text)
-                if mq:
-                    course_name = mq.group(1).strip()
-                else:
-                    course_name = ""
-
-            # Try to detect printed certificate hash (SHA256) in the text
-            certificate_hash = None
-            # Search for a labeled hash first
-            for line in lines:
-                if "Certificate Hash ID:" in line or "Certificate ID:" in line:
-                    parts = line.split(":", 1)
-                    if len(parts) > 1:
-                        possible = parts[1].strip()
-                        m = re.search(r"[a-fA-F0-9]{64}", possible)
-                        if m:
-                            certificate_hash = m.group(0)
-                            break
-            # If not found, search any 64-hex substring in the document
-            if not certificate_hash:
-                joined = " ".join(lines)
-                m = re.search(r"\b[a-fA-F0-9]{64}\b", joined)
-                if m:
-                    certificate_hash = m.group(0)
+        metadata = json.loads(pdf.metadata.get('Keywords') or '')
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(metadata, dict) or metadata.get('schema') != CERTIFICATE_METADATA_SCHEMA:
+        return None
+    return metadata
+
+
+def _read_certificate_metadata(metadata):
+    """
+    Return (uid, candidate_name, course_name, org_name, certificate_id) from the
+    metadata dict written by generate_certificate, or None for legacy PDFs
+    """
+    if metadata is None:
+        return None
+    return (
+        metadata.get('uid'),
+        metadata.get('candidate_name'),
+        metadata.get('course_name'),
+        metadata.get('org_name'),
+        metadata.get('certificate_id'),
+    )
 
-            return uid, candidate_name, course_name, org_name, certificate_hash
-            
+
+def _compact(value):
+    return "".join(str(value).split())
+
+
+def _metadata_matches_page(embedded, text):
+    """
+    Check embedded metadata against the certificate itself: its id must be the
+    hash of its fields, and every field must be printed on the page. Otherwise
+    the metadata could vouch for a real certificate while the page shows edited details.
+    """
+    uid, candidate_name, course_name, org_name, certificate_id = embedded
+    if None in embedded or certificate_id != compute_certificate_id(uid, candidate_name, course_name, org_name):
+        return False
+    # Line wrapping moves whitespace around, so compare with all of it removed
+    page = _compact(text)
+    return all(_compact(field) in page for field in (uid, candidate_name, course_name, org_name))
+
+
+def extract_certificate(pdf_source):
+    """
+    Extract certificate data from a PDF given as a path, bytes, memoryview or binary file object.
+    The page text is always extracted: embedded metadata is only used when it
+    matches the visible page, which spares the heuristic line parsing but not
+    the extraction itself. Legacy or tampered PDFs fall back to parsing the text.
+    """
+    return extract_certificate_with_proof(pdf_source)[0]
+
+
+def extract_certificate_with_proof(pdf_source):
+    """
+    extract_certificate and extract_certificate_proof with the PDF opened once:
+    returns (uid, candidate_name, course_name, org_name, certificate_id), merkle
+    """
+    # Only the verification paths need pdfplumber; keep it out of render workers
+    import pdfplumber
+    try:
+        with pdfplumber.open(open_pdf_source(pdf_source)) as pdf:
+            metadata = _load_certificate_metadata(pdf)
+            return _extract_certificate_fields(pdf, metadata), _read_certificate_proof(metadata)
     except Exception as e:
         print(f"Error extracting certificate data: {str(e)}")
+        return (None, None, None, None, None), None
+
+
+def _extract_certificate_fields(pdf, metadata):
+    # Extract text from each page; the metadata check below needs it as well
+    text = ""
+    for page in pdf.pages:
+        text += page.extract_text() or ""
+
+    embedded = _read_certificate_metadata(metadata)
+    if embedded is not None and _metadata_matches_page(embedded, text):
+        return embedded
+
+    if not text:
+        return None, None, None, None, None
+    
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    
+    if len(lines) < 4:
         return None, None, None, None, None
+        
+    # Initialize defaults
+    org_name = lines[0] if lines else "Unknown Organization"
+    candidate_name = None
+    uid = None
+    course_name = None
+
+    # helper to get next non-empty line
+    def next_nonempty(idx):
+        for j in range(idx + 1, len(lines)):
+            if lines[j].strip():
+                return lines[j].strip()
+        return ""
+
+    # Search lines for UID, candidate name, and course
+    for idx, line in enumerate(lines):
+        l = line
+        if "Student ID:" in l:
+            uid = l.split("Student ID:")[-1].strip()
+
+        if "This is to certify that" in l and idx + 1 < len(lines):
+            candidate_name = next_nonempty(idx)
+
+        if "has successfully completed" in l or "completed the course" in l:
+            # Try to capture quoted course on same line
+            m = re.search(r'"([^"]+)"', l)
+            if m:
+                course_name = m.group(1).strip()
+            else:
+                # fallback to next non-empty line
+                nxt = next_nonempty(idx)
+                if nxt:
+                    course_name = nxt.strip().strip('"')
+
+    # Final fallbacks
+    if not candidate_name:
+        candidate_name = "Unknown Student"
+    if not uid:
+        uid = "Unknown UID"
+    if not course_name:
+        # try to find any quoted substring in full text
+        mq = re.search(r'"([^"]{2,200})"', text)
+        if mq:
+            course_name = mq.group(1).strip()
+        else:
+            course_name = ""
+
+    # Try to detect printed certificate hash (SHA256) in the text
+    certificate_hash = None
+    # Search for a labeled hash first
+    for line in lines:
+        if "Certificate Hash ID:" in line or "Certificate ID:" in line:
+            parts = line.split(":", 1)
+            if len(parts) > 1:
+                possible = parts[1].strip()
+                m = re.search(r"[a-fA-F0-9]{64}", possible)
+                if m:
+                    certificate_hash = m.group(0)
+                    break
+    # If not found, search any 64-hex substring in the document
+    if not certificate_hash:
+        joined = " ".join(lines)
+        m = re.search(r"\b[a-fA-F0-9]{64}\b", joined)
+        if m:
+            certificate_hash = m.group(0)
+
+    return uid, candidate_name, course_name, org_name, certificate_hash
+
+
+def extract_certificate_proof(pdf_source):
+    """
+    Return the {'root', 'proof'} Merkle proof embedded in a batch-anchored
+    certificate, or None. Only the document info is read.
+    """
+    import pdfplumber
+    try:
+        with pdfplumber.open(open_pdf_source(pdf_source)) as pdf:
+            metadata = _load_certificate_metadata(pdf)
+    except Exception as e:
+        print(f"Error reading certificate proof: {e}")
+        return None
+    return _read_certificate_proof(metadata)
+
+
+def _read_certificate_proof(metadata):
+    merkle = metadata.get('merkle') if metadata else None
+    if not isinstance(merkle, dict) or not isinstance(merkle.get('root'), str) or not isinstance(merkle.get('proof'), list):
+        return None
+    return merkle
+
+
+def render_certificate_preview(pdf_source, resolution=100):
+    """
+    Render the first page of a certificate PDF (path or bytes) to PNG bytes
+    """
+    import pdfplumber
+    with pdfplumber.open(open_pdf_source(pdf_source)) as pdf:
+        image = pdf.pages[0].to_image(resolution=resolution).original
+    out = io.BytesIO()
+    image.save(out, format="PNG", optimize=True)
+    return out.getvalue()
 
 
 def get_certificate_template_info():
@@ -0,0 +1,200 @@
+import os
+import sys
+from concurrent.futures import as_completed
+import requests
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from connection import get_contract, get_w3
+from utils.tx_pipeline import get_transaction_pipeline
+
+# Share of the block gas limit a single batch may use
+BATCH_GAS_FRACTION = 0.9
+# Upper bound on items per batch so transactions stay well under node size limits
+MAX_BATCH_SIZE = 200
+# Ids per eth_call to start with; halved whenever the node rejects a call as too big
+READ_BATCH_SIZE = int(os.getenv("READ_BATCH_SIZE", "500"))
+
+
+def _too_big(error):
+    """
+    Whether a failed eth_call may succeed with fewer ids: the node answered with
+    an error (web3 raises ValueError for those, e.g. the gas cap or a response
+    size limit) or refused the request body as too large. Connection errors and
+    timeouts are not, so an unreachable node fails on the first call.
+    """
+    if isinstance(error, ValueError):
+        return True
+    return isinstance(error, requests.HTTPError) and error.response is not None and error.response.status_code == 413
+
+
+def _call_in_chunks(function_name, certificate_ids):
+    """
+    Run a batch view function over certificate_ids, splitting the list into calls
+    small enough for the node's gas cap and response size limit
+    """
+    contract = get_contract()
+    certificate_ids = list(certificate_ids)
+    results = []
+    size = READ_BATCH_SIZE
+    i = 0
+    while i < len(certificate_ids):
+        chunk = certificate_ids[i:i + size]
+        try:
+            results.extend(getattr(contract.functions, function_name)(chunk).call())
+        except Exception as e:
+            if len(chunk) == 1 or not _too_big(e):
+                raise
+            size = max(1, len(chunk) // 2)
+            continue
+        i += len(chunk)
+    return results
+
+
+def are_verified(certificate_ids):
+    """
+    Check many certificate IDs with batched areVerified calls.
+    Returns a list of booleans in input order.
+    """
+    return _call_in_chunks('areVerified', certificate_ids)
+
+
+def get_certificates(certificate_ids):
+    """
+    Fetch many certificates with batched getCertificates calls.
+    Returns, in input order, a (uid, candidate_name, course_name, org_name, ipfs_hash)
+    tuple per id, or None for ids that were never issued.
+    """
+    return [
+        tuple(cert) if cert[4] else None
+        for cert in _call_in_chunks('getCertificates', certificate_ids)
+    ]
+
+
+def _batch_call(records):
+    return get_contract().functions.generateCertificatesBatch(
+        [r['certificate_id'] for r in records],
+        [str(r['uid']) for r in records],
+        [r['candidate_name'] for r in records],
+        [r['course_name'] for r in records],
+        [r['org_name'] for r in records],
+        [r['ipfs_hash'] for r in records],
+    )
+
+
+def plan_certificate_batches(records, sender, gas_budget):
+    """
+    Split records into batches sized from estimate_gas so each fits in gas_budget.
+    Yields (batch, estimated_gas, error); a record whose estimate fails on its own
+    is yielded alone with the error so it can be reported without sending it.
+    """
+    i = 0
+    size = 1  # Probe with a single item first to learn the per-item cost
+    while i < len(records):
+        batch = records[i:i + size]
+        try:
+            gas = _batch_call(batch).estimateGas({'from': sender})
+        except Exception as e:
+            if len(batch) == 1:
+                yield batch, None, e
+                i += 1
+            else:
+                size = max(1, len(batch) // 2)
+            continue
+
+        if gas > gas_budget and len(batch) > 1:
+            size = max(1, min(len(batch) - 1, int(len(batch) * gas_budget / gas)))
+            continue
+
+        yield batch, gas, None
+        i += len(batch)
+        per_item = gas / len(batch)
+        size = max(1, min(MAX_BATCH_SIZE, int(gas_budget / per_item)))
+
+
+def issue_certificates_batch(records, sender=None, progress_callback=None):
+    """
+    Anchor many certificates on-chain through generateCertificatesBatch
+    records: List of dictionaries with keys: certificate_id, uid, candidate_name,
+             course_name, org_name, ipfs_hash
+    progress_callback: Optional callable(processed, total)
+    Batches are pipelined through the shared transaction pipeline, so several
+    are in flight at once. Returns one result dict per record, in input order,
+    with status 'confirmed', 'exists', 'duplicate', 'reverted', 'dropped' or 'error'.
+    """
+    pipeline = get_transaction_pipeline(sender)
+    total = len(records)
+    results = [None] * total
+    processed = 0
+
+    pending = []
+    seen = set()
+    verified = are_verified([record['certificate_id'] for record in records])
+    for i, record in enumerate(records):
+        if record['certificate_id'] in seen:
+            results[i] = {'status': 'duplicate', 'tx_hash': None}
+            processed += 1
+        elif verified[i]:
+            results[i] = {'status': 'exists', 'tx_hash': None}
+            processed += 1
+        else:
+            pending.append(i)
+        seen.add(record['certificate_id'])
+    if progress_callback and processed:
+        progress_callback(processed, total)
+
+    gas_limit = get_w3().eth.get_block('latest')['gasLimit']
+    gas_budget = int(gas_limit * BATCH_GAS_FRACTION)
+
+    futures = []
+    cursor = 0
+    pending_records = [records[i] for i in pending]
+    for batch, gas, error in plan_certificate_batches(pending_records, pipeline.sender, gas_budget):
+        indices = pending[cursor:cursor + len(batch)]
+        cursor += len(batch)
+        if error is not None:
+            for i in indices:
+                results[i] = {'status': 'error', 'tx_hash': None, 'error': str(error)}
+            processed += len(indices)
+            if progress_callback:
+                progress_callback(processed, total)
+            continue
+        futures.append(pipeline.submit(_batch_call(batch), key=indices, gas=min(int(gas * 1.2), gas_limit)))
+
+    for future in as_completed(futures):
+        outcome = future.result()
+        for i in outcome['key']:
+            results[i] = {'status': outcome['status'], 'tx_hash': outcome['tx_hash']}
+            if outcome['error']:
+                results[i]['error'] = outcome['error']
+        processed += len(outcome['key'])
+        if progress_callback:
+            progress_callback(processed, total)
+
+    return [
+        {'certificate_id': record['certificate_id'], **result}
+        for record, result in zip(records, results)
+    ]
+
+
+def is_batch_anchored(merkle_root):
+    """
+    Check whether a Merkle batch root (0x-prefixed hex) has been anchored on-chain
+    """
+    return get_contract().functions.isBatchAnchored(bytes.fromhex(merkle_root[2:])).call()
+
+
+def anchor_merkle_batch(merkle_root, size, sender=None):
+    """
+    Anchor a whole batch of certificates by writing its Merkle root in one
+    transaction. Returns a result dict with status 'confirmed', 'exists',
+    'reverted', 'dropped' or 'error', like issue_certificates_batch.
+    """
+    if is_batch_anchored(merkle_root):
+        return {'status': 'exists', 'tx_hash': None}
+    pipeline = get_transaction_pipeline(sender)
+    outcome = pipeline.submit(
+        get_contract().functions.anchorBatch(bytes.fromhex(merkle_root[2:]), size), key=merkle_root
+    ).result()
+    result = {'status': outcome['status'], 'tx_hash': outcome['tx_hash']}
+    if outcome['error']:
+        result['error'] = outcome['error']
+    return result
@@ -0,0 +1,158 @@
+import base64
+import hashlib
+
+# Defaults of `ipfs add` (and therefore Pinata): size-262144 chunker, balanced DAG
+CHUNK_SIZE = 262144
+MAX_LINKS = 174
+
+_BASE58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+_SHA2_256 = 0x12
+_CODEC_RAW = 0x55
+_CODEC_DAG_PB = 0x70
+_UNIXFS_FILE = 2
+
+
+def _varint(n):
+    out = bytearray()
+    while True:
+        byte = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _field_bytes(field, value):
+    return _varint(field << 3 | 2) + _varint(len(value)) + value
+
+
+def _field_varint(field, value):
+    return _varint(field << 3) + _varint(value)
+
+
+def _base58(data):
+    n = int.from_bytes(data, "big")
+    out = ""
+    while n:
+        n, rem = divmod(n, 58)
+        out = _BASE58_ALPHABET[rem] + out
+    return "1" * (len(data) - len(data.lstrip(b"\0"))) + out
+
+
+def _unixfs_file(data=b"", filesize=0, blocksizes=()):
+    out = _field_varint(1, _UNIXFS_FILE)
+    if data:
+        out += _field_bytes(2, data)
+    out += _field_varint(3, filesize)
+    for size in blocksizes:
+        out += _field_varint(4, size)
+    return out
+
+
+def _dag_pb_node(data, links=()):
+    # dag-pb serialises Links (field 2) before Data (field 1)
+    out = b""
+    for link_hash, tsize in links:
+        out += _field_bytes(2, _field_bytes(1, link_hash) + _field_bytes(2, b"") + _field_varint(3, tsize))
+    return out + _field_bytes(1, data)
+
+
+def _cid_bytes(block, version, codec):
+    multihash = bytes([_SHA2_256, 32]) + hashlib.sha256(block).digest()
+    if version == 0:
+        return multihash
+    return _varint(1) + _varint(codec) + multihash
+
+
+class _Node:
+    __slots__ = ("cid", "tsize", "filesize")
+
+    def __init__(self, cid, tsize, filesize):
+        self.cid = cid
+        self.tsize = tsize
+        self.filesize = filesize
+
+
+def _leaf(chunk, version):
+    if version == 0:
+        block = _dag_pb_node(_unixfs_file(chunk, len(chunk)))
+        return _Node(_cid_bytes(block, 0, _CODEC_DAG_PB), len(block), len(chunk))
+    # CIDv1 uses raw leaves
+    return _Node(_cid_bytes(chunk, 1, _CODEC_RAW), len(chunk), len(chunk))
+
+
+def _parent(children, version):
+    filesize = sum(child.filesize for child in children)
+    block = _dag_pb_node(
+        _unixfs_file(filesize=filesize, blocksizes=[child.filesize for child in children]),
+        [(child.cid, child.tsize) for child in children]
+    )
+    return _Node(
+        _cid_bytes(block, version, _CODEC_DAG_PB),
+        len(block) + sum(child.tsize for child in children),
+        filesize
+    )
+
+
+def compute_cid(data, version=0):
+    """
+    Compute the IPFS CID `ipfs add` would assign to data, without uploading it.
+    version 0 gives a base58 'Qm...' CID, version 1 a base32 'b...' CID with raw leaves.
+    """
+    view = memoryview(data)
+    offsets = iter(range(0, max(len(view), 1), CHUNK_SIZE))
+
+    def next_leaf():
+        offset = next(offsets, None)
+        if offset is None:
+            return None
+        return _leaf(bytes(view[offset:offset + CHUNK_SIZE]), version)
+
+    def fill(children, depth):
+        # Mirrors the balanced builder: fill each subtree fully before starting the next
+        while len(children) < MAX_LINKS:
+            child = next_leaf() if depth == 1 else fill([], depth - 1)
+            if child is None:
+                break
+            children.append(child)
+        return _parent(children, version) if children else None
+
+    root = next_leaf()
+    depth = 1
+    while True:
+        following = next_leaf() if depth == 1 else fill([], depth - 1)
+        if following is None:
+            break
+        root = fill([root, following], depth)
+        depth += 1
+
+    if version == 0:
+        return _base58(root.cid)
+    return "b" + base64.b32encode(root.cid).decode("ascii").lower().rstrip("=")
+
+
+def cid_version(cid):
+    """
+    Return 0 or 1 for CIDs this module can reproduce, None otherwise
+    """
+    if cid.startswith("Qm") and len(cid) == 46:
+        return 0
+    if cid.startswith("b"):
+        try:
+            raw = base64.b32decode(cid[1:].upper() + "=" * (-len(cid[1:]) % 8))
+        except ValueError:
+            return None
+        if raw[:1] == b"\x01" and raw[1:2] in (bytes([_CODEC_RAW]), bytes([_CODEC_DAG_PB])) \
+                and raw[2:4] == bytes([_SHA2_256, 32]):
+            return 1
+    return None
+
+
+def verify_cid(cid, data):
+    """
+    True when data hashes to cid; False on mismatch or for CID formats that cannot be reproduced
+    """
+    version = cid_version(cid)
+    return version is not None and compute_cid(data, version) == cid
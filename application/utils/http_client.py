@@ -0,0 +1,208 @@
+import email.utils
+import os
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+# (connect, read) timeouts per endpoint, in seconds
+ENDPOINT_TIMEOUTS = {
+    "pinata_api": (5, 120),
+    "ipfs_gateway": (5, 30),
+}
+DEFAULT_TIMEOUT = (5, 30)
+# Requests per second allowed per endpoint (the Pinata plan quota); unlisted endpoints are not limited
+ENDPOINT_RATE_LIMITS = {
+    "pinata_api": float(os.getenv("PINATA_REQUESTS_PER_SECOND", "3")),
+}
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30
+# Longest Retry-After we are willing to wait inside one request
+RETRY_AFTER_MAX = 60
+# Consecutive failures that open an endpoint's circuit, and how long it stays open
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 30
+
+
+class CircuitOpenError(requests.RequestException):
+    """
+    Raised without contacting the endpoint while its circuit breaker is open
+    """
+
+
+class _CircuitBreaker:
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    def before_request(self, endpoint):
+        with self.lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.reset_timeout or self.trial_in_flight:
+                raise CircuitOpenError(f"{endpoint} is temporarily unavailable (circuit open)")
+            # Half-open: let a single trial request through
+            self.trial_in_flight = True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class AdaptiveRateLimiter:
+    """
+    Spaces requests to at most `rate` per second across all threads.
+    The rate is halved whenever the server answers 429 and creeps back
+    towards the configured maximum with every successful request.
+    """
+
+    def __init__(self, rate, min_rate=0.1, increase=0.05):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate
+        self.increase = increase
+        self._next_slot = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + 1.0 / self.rate
+        if slot > now:
+            time.sleep(slot - now)
+
+    def on_throttled(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._next_slot = max(self._next_slot, time.monotonic() + 1.0 / self.rate)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+
+def _retry_after_seconds(response):
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class HttpClient:
+    """
+    Shared HTTP client for Pinata and the IPFS gateway.
+    Keeps pooled keep-alive connections, applies per-endpoint timeouts and
+    adaptive rate limits, retries
+    429/5xx responses and connection errors with jittered exponential backoff
+    (honouring Retry-After), and trips a per-endpoint circuit breaker after
+    repeated failures so callers fail fast instead of piling up.
+    """
+
+    def __init__(self, pool_size=32, max_retries=MAX_RETRIES):
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._breakers = {}
+        self._breakers_lock = threading.Lock()
+        self._rate_limiters = {
+            endpoint: AdaptiveRateLimiter(rate) for endpoint, rate in ENDPOINT_RATE_LIMITS.items() if rate > 0
+        }
+
+    def _breaker(self, endpoint):
+        with self._breakers_lock:
+            if endpoint not in self._breakers:
+                self._breakers[endpoint] = _CircuitBreaker(FAILURE_THRESHOLD, RESET_TIMEOUT)
+            return self._breakers[endpoint]
+
+    def request(self, method, url, endpoint, **kwargs):
+        """
+        Send a request, retrying transient failures. The last response is
+        returned even if it is an error status; connection errors that outlast
+        the retries are raised.
+        """
+        kwargs.setdefault("timeout", ENDPOINT_TIMEOUTS.get(endpoint, DEFAULT_TIMEOUT))
+        breaker = self._breaker(endpoint)
+        rate_limiter = self._rate_limiters.get(endpoint)
+        attempt = 0
+        while True:
+            breaker.before_request(endpoint)
+            if rate_limiter is not None:
+                rate_limiter.acquire()
+            retry_after = None
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                breaker.record_failure()
+                if attempt >= self.max_retries:
+                    raise
+            except Exception:
+                # Not worth retrying (SSLError, ChunkedEncodingError, a failing hook, ...), but it
+                # must still count, or a half-open trial would leave the circuit open for good
+                breaker.record_failure()
+                raise
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    breaker.record_success()
+                    if rate_limiter is not None:
+                        rate_limiter.on_success()
+                    return response
+                if response.status_code == 429 and rate_limiter is not None:
+                    rate_limiter.on_throttled()
+                breaker.record_failure()
+                if attempt >= self.max_retries:
+                    return response
+                retry_after = _retry_after_seconds(response)
+                response.close()
+
+            delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.0)
+            if retry_after is not None:
+                delay = max(delay, min(retry_after, RETRY_AFTER_MAX))
+            time.sleep(delay)
+            attempt += 1
+
+    def get(self, url, endpoint, **kwargs):
+        return self.request("GET", url, endpoint, **kwargs)
+
+    def post(self, url, endpoint, **kwargs):
+        return self.request("POST", url, endpoint, **kwargs)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_http_client():
+    """
+    Return the process-wide HTTP client
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+        return _client
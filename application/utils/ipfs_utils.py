@@ -0,0 +1,298 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import json
+import requests
+from utils.cid_utils import compute_cid, verify_cid
+from utils.http_client import get_http_client
+
+try:
+    import fcntl
+except ImportError:  # Windows: eviction runs without the cross-process lock
+    fcntl = None
+
+PINATA_API_URL = "https://api.pinata.cloud/pinning/pinFileToIPFS"
+PINATA_GATEWAY_URL = os.getenv("PINATA_GATEWAY_URL", "https://gateway.pinata.cloud/ipfs")
+IPFS_CACHE_DIR = os.getenv(
+    "IPFS_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".ipfs_cache")
+)
+IPFS_CACHE_MAX_BYTES = int(os.getenv("IPFS_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+# Largest object fetch_from_ipfs will download; certificates are a few hundred KB
+IPFS_MAX_FETCH_BYTES = int(os.getenv("IPFS_MAX_FETCH_BYTES", str(10 * 1024 * 1024)))
+FETCH_CHUNK_SIZE = 64 * 1024
+PIN_RECORD_PATH = os.getenv(
+    "PIN_RECORD_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pinned_cids.db")
+)
+
+
+class IPFSFetchError(Exception):
+    """
+    Raised when content cannot be retrieved from IPFS
+    """
+
+
+class IPFSCache:
+    """
+    Disk-backed, content-addressed cache of IPFS content keyed by CID.
+    Entries are only inserted after the bytes have been verified against their
+    CID and are written with an atomic rename, so any number of processes can
+    share the directory. Reads refresh the file's mtime, and eviction removes
+    the least recently used files once the cache grows past max_bytes.
+    """
+
+    def __init__(self, directory=IPFS_CACHE_DIR, max_bytes=IPFS_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, cid):
+        # CIDs come from the chain, so refuse anything that could escape the cache directory
+        if not cid.isalnum():
+            raise ValueError(f"Invalid CID: {cid!r}")
+        # The leading characters of a CID are constant, so shard on the tail
+        return os.path.join(self.directory, cid[-2:], cid)
+
+    def get(self, cid):
+        """
+        Return the cached bytes for cid, or None on a miss
+        """
+        try:
+            path = self._path(cid)
+        except ValueError:
+            return None
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass  # Evicted by another process while we were reading
+        return data
+
+    def put(self, cid, data):
+        """
+        Store data under cid after checking that it really hashes to cid.
+        Returns False (and stores nothing) when verification fails.
+        """
+        if not verify_cid(cid, data):
+            return False
+        path = self._path(cid)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._evict()
+        return True
+
+    def _evict(self):
+        lock_file = open(os.path.join(self.directory, ".lock"), "a+")
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            entries = []
+            total = 0
+            for shard in os.scandir(self.directory):
+                if not shard.is_dir():
+                    continue
+                for entry in os.scandir(shard.path):
+                    if entry.name.startswith(".tmp-"):
+                        continue
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+            if total <= self.max_bytes:
+                return
+            entries.sort()
+            for _, size, path in entries:
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                if total <= self.max_bytes:
+                    break
+        finally:
+            lock_file.close()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_ipfs_cache():
+    """
+    Return the process-wide IPFS cache
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = IPFSCache()
+        return _cache
+
+
+class PinRecord:
+    """
+    Local SQLite record of CIDs this deployment has already pinned to Pinata.
+    Uploads check it with the locally computed CID and skip content that is
+    already pinned, so re-runs and retries cost no upload bandwidth.
+    """
+
+    def __init__(self, path=PIN_RECORD_PATH):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pins (cid TEXT PRIMARY KEY, size INTEGER NOT NULL, pinned_at REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def contains(self, cid):
+        return self._connect().execute("SELECT 1 FROM pins WHERE cid = ?", (cid,)).fetchone() is not None
+
+    def add(self, cid, size):
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO pins (cid, size, pinned_at) VALUES (?, ?, ?)", (cid, size, time.time()))
+
+    def discard(self, cid):
+        """
+        Forget cid, e.g. after it was unpinned on Pinata, so the next upload sends it again
+        """
+        with self._connect() as conn:
+            conn.execute("DELETE FROM pins WHERE cid = ?", (cid,))
+
+
+_pin_record = None
+_pin_record_lock = threading.Lock()
+
+
+def get_pin_record():
+    """
+    Return the process-wide record of pinned CIDs
+    """
+    global _pin_record
+    with _pin_record_lock:
+        if _pin_record is None:
+            _pin_record = PinRecord()
+        return _pin_record
+
+
+def fetch_from_ipfs(ipfs_hash):
+    """
+    Return the content stored under ipfs_hash, served from the local cache when
+    possible and streamed from the Pinata gateway otherwise (up to
+    IPFS_MAX_FETCH_BYTES). Raises IPFSFetchError.
+    """
+    cache = get_ipfs_cache()
+    data = cache.get(ipfs_hash)
+    if data is not None:
+        return data
+
+    content_url = f"{PINATA_GATEWAY_URL}/{ipfs_hash}"
+    headers = {
+        'Accept': 'application/pdf',
+        'User-Agent': 'Mozilla/5.0'
+    }
+    try:
+        response = get_http_client().get(content_url, "ipfs_gateway", headers=headers, stream=True)
+    except requests.RequestException as e:
+        raise IPFSFetchError(f"IPFS gateway is unavailable right now, please try again shortly ({e})")
+    with response:
+        if response.status_code != 200:
+            raise IPFSFetchError(
+                f"Failed to fetch certificate from IPFS. Status code: {response.status_code}. "
+                f"Response: {response.text[:200]}"
+            )
+        data = _read_capped(response, ipfs_hash)
+
+    try:
+        if not cache.put(ipfs_hash, data):
+            print(f"Content for {ipfs_hash} could not be verified against its CID; not caching it")
+    except OSError as e:
+        print(f"Error writing IPFS cache: {e}")
+    return data
+
+
+def _read_capped(response, ipfs_hash):
+    """
+    Read a streamed response in chunks, refusing anything larger than IPFS_MAX_FETCH_BYTES
+    """
+    too_large = IPFSFetchError(f"Content for {ipfs_hash} is larger than {IPFS_MAX_FETCH_BYTES} bytes; refusing to fetch it")
+    declared = response.headers.get("Content-Length")
+    if declared and declared.isdigit() and int(declared) > IPFS_MAX_FETCH_BYTES:
+        raise too_large
+    data = bytearray()
+    try:
+        for chunk in response.iter_content(FETCH_CHUNK_SIZE):
+            data += chunk
+            if len(data) > IPFS_MAX_FETCH_BYTES:
+                raise too_large
+    except requests.RequestException as e:
+        raise IPFSFetchError(f"Download from the IPFS gateway was interrupted, please try again shortly ({e})")
+    return bytes(data)
+
+
+def upload_to_pinata(file_path, api_key, api_secret):
+    """
+    Pin a file to IPFS through Pinata and return its IPFS hash, or None on failure
+    """
+    # Read the file up front so a retried request can resend the same body
+    with open(file_path, "rb") as file:
+        return upload_bytes_to_pinata(file.read(), file.name, api_key, api_secret)
+
+
+def upload_bytes_to_pinata(data, file_name, api_key, api_secret):
+    """
+    Pin in-memory content to IPFS through Pinata and return its IPFS hash, or None on failure.
+    Content whose CID is already in the local pin record is not uploaded again.
+    """
+    # Pinata pins single files as CIDv0 with the default chunker, which compute_cid reproduces
+    cid = compute_cid(data)
+    pin_record = get_pin_record()
+    if pin_record.contains(cid):
+        print(f"File already pinned, skipping upload. IPFS Hash: {cid}")
+        return cid
+
+    headers = {
+        "pinata_api_key": api_key,
+        "pinata_secret_api_key": api_secret,
+    }
+    files = {"file": (file_name, data)}
+
+    try:
+        response = get_http_client().post(PINATA_API_URL, "pinata_api", headers=headers, files=files)
+        result = json.loads(response.text)
+    except (requests.RequestException, ValueError) as e:
+        print(f"Error uploading to Pinata: {e}")
+        return None
+
+    if "IpfsHash" in result:
+        ipfs_hash = result["IpfsHash"]
+        print(f"File uploaded to Pinata. IPFS Hash: {ipfs_hash}")
+        if ipfs_hash == cid:
+            pin_record.add(cid, len(data))
+        else:
+            print(f"Pinata returned {ipfs_hash} but the local CID is {cid}; not recording it as pinned")
+        return ipfs_hash
+    else:
+        print(f"Error uploading to Pinata: {result.get('error', 'Unknown error')}")
+        return None
+
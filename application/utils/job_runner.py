@@ -0,0 +1,115 @@
+import itertools
+import os
+import queue
+import sys
+import threading
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.bulk_jobs import BulkJob, purge_expired_jobs
+
+# Bulk jobs run at once; further jobs wait in the queue by priority, then submission order
+JOB_RUNNER_WORKERS = int(os.getenv("JOB_RUNNER_WORKERS", "1"))
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+QUEUED = 'queued'
+RUNNING = 'running'
+FINISHED = 'finished'
+ERROR = 'error'
+
+
+class JobRunner:
+    """
+    Process-wide runner for bulk jobs. Pages submit a job id and return at once;
+    worker threads take jobs off a priority queue and run them to completion, so
+    a long batch survives reruns of the page that started it and never holds up
+    a session's script thread. A running job's per-stage progress is kept in its
+    status, and the results CSV and ZIP are written into the job directory when it
+    finishes. Workers also delete completed jobs older than JOB_RETENTION_DAYS.
+    """
+
+    def __init__(self, workers=JOB_RUNNER_WORKERS):
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._status = {}
+        self._lock = threading.Lock()
+        for i in range(max(1, workers)):
+            threading.Thread(target=self._work, name=f"job-runner-{i}", daemon=True).start()
+
+    def submit(self, job_id, priority=PRIORITY_NORMAL):
+        """
+        Queue job_id to run; a job that is already queued or running is left alone
+        """
+        with self._lock:
+            status = self._status.get(job_id)
+            if status and status['state'] in (QUEUED, RUNNING):
+                return
+            self._status[job_id] = {'state': QUEUED, 'priority': priority, 'error': None, 'progress': None,
+                                    'submitted_at': time.time(), 'finished_at': None}
+        self._queue.put((priority, next(self._sequence), job_id))
+
+    def status(self, job_id):
+        """
+        Return a copy of the job's runner status, or None if it was never submitted here
+        """
+        with self._lock:
+            status = self._status.get(job_id)
+            return dict(status) if status else None
+
+    def is_active(self, job_id):
+        status = self.status(job_id)
+        return status is not None and status['state'] in (QUEUED, RUNNING)
+
+    def forget(self, job_id):
+        """
+        Drop the status of a job that is no longer active
+        """
+        with self._lock:
+            status = self._status.get(job_id)
+            if status and status['state'] not in (QUEUED, RUNNING):
+                del self._status[job_id]
+
+    def _set(self, job_id, **fields):
+        with self._lock:
+            self._status[job_id].update(fields)
+
+    def _purge(self):
+        try:
+            purge_expired_jobs()
+        except OSError as e:
+            print(f"Error purging expired bulk jobs: {e}")
+
+    def _work(self):
+        self._purge()
+        while True:
+            _, _, job_id = self._queue.get()
+            self._set(job_id, state=RUNNING)
+            try:
+                job = BulkJob(job_id)
+                job.run(progress_callback=lambda progress: self._set(job_id, progress=progress))
+                job.export_results(job.artifact_path("results.csv"))
+                job.export_zip()
+                self._set(job_id, state=FINISHED, finished_at=time.time())
+            except Exception as e:
+                print(f"Bulk job {job_id} failed: {e}")
+                self._set(job_id, state=ERROR, error=str(e), finished_at=time.time())
+            finally:
+                self._queue.task_done()
+            self._purge()
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_job_runner():
+    """
+    Return the process-wide job runner, starting its workers on first use
+    """
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = JobRunner()
+        return _runner
@@ -0,0 +1,69 @@
+import hashlib
+
+# Leaves and inner nodes are hashed with different prefixes, so an inner node
+# can never be passed off as a certificate
+LEAF_PREFIX = b"\x00"
+NODE_PREFIX = b"\x01"
+
+
+def merkle_leaf(certificate_id):
+    return hashlib.sha256(LEAF_PREFIX + certificate_id.encode('utf-8')).digest()
+
+
+def _parent(left, right):
+    # Pairs are sorted before hashing, so a proof is just the list of siblings
+    if right < left:
+        left, right = right, left
+    return hashlib.sha256(NODE_PREFIX + left + right).digest()
+
+
+class MerkleTree:
+    """
+    SHA-256 Merkle tree over the certificate ids of a batch. Only the root goes
+    on-chain; each certificate carries proof(index), the sibling hashes on the
+    path to the root. An unpaired node is carried up to the next level as is.
+    """
+
+    def __init__(self, certificate_ids):
+        level = [merkle_leaf(certificate_id) for certificate_id in certificate_ids]
+        if not level:
+            raise ValueError("A Merkle tree needs at least one certificate")
+        self.levels = [level]
+        while len(level) > 1:
+            level = [
+                _parent(level[i], level[i + 1]) if i + 1 < len(level) else level[i]
+                for i in range(0, len(level), 2)
+            ]
+            self.levels.append(level)
+
+    @property
+    def root(self):
+        """
+        The root as a 0x-prefixed hex string (the contract's bytes32)
+        """
+        return "0x" + self.levels[-1][0].hex()
+
+    def proof(self, index):
+        """
+        Return the proof for the index-th certificate as a list of hex sibling hashes
+        """
+        proof = []
+        for level in self.levels[:-1]:
+            sibling = index ^ 1
+            if sibling < len(level):
+                proof.append(level[sibling].hex())
+            index //= 2
+        return proof
+
+
+def verify_merkle_proof(certificate_id, proof, root):
+    """
+    Check that proof links certificate_id to root, without any chain access
+    """
+    try:
+        node = merkle_leaf(certificate_id)
+        for sibling in proof:
+            node = _parent(node, bytes.fromhex(sibling))
+        return node == bytes.fromhex(root[2:] if root.startswith("0x") else root)
+    except (AttributeError, TypeError, ValueError):
+        return False
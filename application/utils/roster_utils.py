@@ -0,0 +1,180 @@
+import csv
+import io
+import os
+import sqlite3
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.cert_utils import (
+    compute_certificate_ids, MAX_UID_LENGTH, MAX_CANDIDATE_NAME_LENGTH, MAX_COURSE_NAME_LENGTH
+)
+
+REQUIRED_COLUMNS = ['uid', 'candidate_name', 'course_name']
+# Rows parsed per pandas chunk when streaming a roster CSV
+CSV_CHUNK_ROWS = int(os.getenv("CSV_CHUNK_ROWS", "5000"))
+
+
+def _rewind(csv_file):
+    if hasattr(csv_file, "seek"):
+        csv_file.seek(0)
+
+
+def read_roster_preview(csv_file, rows=5):
+    """
+    Return the first rows of a roster CSV as a DataFrame without parsing the rest
+    """
+    import pandas as pd
+    _rewind(csv_file)
+    preview = pd.read_csv(csv_file, nrows=rows, dtype=str, keep_default_na=False)
+    _rewind(csv_file)
+    return preview
+
+
+def count_roster_rows(csv_file):
+    """
+    Count the data rows of a roster CSV in one streaming pass (quoted newlines are handled)
+    """
+    _rewind(csv_file)
+    text = io.TextIOWrapper(csv_file, encoding="utf-8-sig", newline="")
+    try:
+        count = max(0, sum(1 for _ in csv.reader(text)) - 1)
+    finally:
+        text.detach()
+    _rewind(csv_file)
+    return count
+
+
+class RosterValidator:
+    """
+    Validates roster rows a whole DataFrame (or chunk) at a time: blank fields,
+    length limits, UIDs and certificate ids repeated within the roster, and,
+    with check_issued, certificate ids already in the local index or on chain.
+    Certificate ids are computed for every row in the same pass. UIDs and ids
+    seen in earlier chunks are remembered, so duplicates are caught across a
+    streamed CSV.
+    """
+
+    def __init__(self, org_name, check_issued=False):
+        self.org_name = org_name
+        self.check_issued = check_issued
+        self._seen_uids = set()
+        self._seen_ids = set()
+
+    def validate(self, roster):
+        """
+        Return a copy of roster (uid, candidate_name, course_name columns) with a
+        'certificate_id' column and an 'errors' column, '' for valid rows
+        """
+        import pandas as pd
+        roster = roster[REQUIRED_COLUMNS].fillna("").astype(str)
+        uids = roster['uid']
+        certificate_ids = pd.Series(
+            compute_certificate_ids(uids, roster['candidate_name'], roster['course_name'], self.org_name),
+            index=roster.index, dtype=object
+        )
+
+        checks = [
+            (uids.str.strip().eq(""), "UID is required"),
+            (roster['candidate_name'].str.strip().eq(""), "Candidate name is required"),
+            (roster['course_name'].str.strip().eq(""), "Course name is required"),
+            (uids.str.len().gt(MAX_UID_LENGTH), f"UID is too long (max {MAX_UID_LENGTH} characters)"),
+            (roster['candidate_name'].str.len().gt(MAX_CANDIDATE_NAME_LENGTH),
+             f"Candidate name is too long (max {MAX_CANDIDATE_NAME_LENGTH} characters)"),
+            (roster['course_name'].str.len().gt(MAX_COURSE_NAME_LENGTH),
+             f"Course name is too long (max {MAX_COURSE_NAME_LENGTH} characters)"),
+            (uids.duplicated(), "Duplicate UID in this roster"),
+            (certificate_ids.duplicated(), "Duplicate certificate in this roster"),
+        ]
+        if self._seen_uids:
+            checks.append((uids.isin(self._seen_uids), "Duplicate UID in this roster"))
+            checks.append((certificate_ids.isin(self._seen_ids), "Duplicate certificate in this roster"))
+        if not self.org_name or not self.org_name.strip():
+            checks.append((uids.eq(uids), "Organization name is required"))
+        if self.check_issued:
+            issued = self._issued(set(certificate_ids))
+            checks.append((certificate_ids.isin(issued), "Certificate already issued"))
+
+        errors = pd.Series("", index=roster.index, dtype=object)
+        for mask, message in checks:
+            if mask.any():
+                errors[mask] += message + ", "
+        roster['certificate_id'] = certificate_ids
+        roster['errors'] = errors.str[:-2]
+
+        self._seen_uids.update(uids)
+        self._seen_ids.update(certificate_ids)
+        return roster
+
+    def _issued(self, certificate_ids):
+        """
+        The subset of certificate_ids already issued: read from the index (issued
+        one by one, or anchored in a Merkle batch), with the chain asked about the rest
+        """
+        # Imported here so rosters that are only rendered never load the chain clients
+        from utils.cert_index import get_certificate_index
+        from utils.chain_utils import are_verified
+        try:
+            index = get_certificate_index()
+            issued = set(index.get_many(certificate_ids))
+            # Only the batch root is on chain, so areVerified cannot see these
+            issued.update(index.batch_roots(certificate_ids - issued))
+        except sqlite3.Error as e:
+            print(f"Error reading certificate index: {e}")
+            issued = set()
+        unknown = list(certificate_ids - issued)
+        if unknown:
+            try:
+                issued.update(certificate_id for certificate_id, verified in zip(unknown, are_verified(unknown)) if verified)
+            except Exception as e:
+                # Issuing still reports ids that turn out to exist, so carry on without the chain check
+                print(f"Error checking certificates on chain: {e}")
+        return issued
+
+
+def validate_roster(roster, org_name, check_issued=False):
+    """
+    Validate a whole roster DataFrame at once; see RosterValidator
+    """
+    return RosterValidator(org_name, check_issued).validate(roster)
+
+
+def _iter_validated(chunks, validator, on_invalid, with_row_numbers):
+    row_number = 0
+    for chunk in chunks:
+        validated = validator.validate(chunk)
+        for uid, candidate_name, course_name, certificate_id, errors in validated.itertuples(index=False, name=None):
+            row_number += 1
+            row = {'uid': uid, 'candidate_name': candidate_name, 'course_name': course_name,
+                   'certificate_id': certificate_id}
+            if errors:
+                if on_invalid:
+                    on_invalid(row_number, row, errors.split(", "))
+                continue
+            yield (row_number, row) if with_row_numbers else row
+
+
+def iter_roster_rows(csv_file, org_name, on_invalid=None, chunk_rows=CSV_CHUNK_ROWS, with_row_numbers=False,
+                     check_issued=False):
+    """
+    Stream a roster CSV in chunks of chunk_rows and yield one
+    {uid, candidate_name, course_name, certificate_id} dict per valid row, or a
+    (row_number, dict) pair when with_row_numbers is set.
+    Each chunk is validated at once with RosterValidator; invalid rows are skipped
+    and reported through on_invalid(row_number, row, errors), row_number counting
+    data rows from 1. Only one chunk of rows is held in memory at a time, plus the
+    UIDs and ids seen so far for duplicate detection.
+    """
+    import pandas as pd
+    _rewind(csv_file)
+    chunks = pd.read_csv(
+        csv_file, chunksize=chunk_rows, usecols=REQUIRED_COLUMNS, dtype=str, keep_default_na=False
+    )
+    return _iter_validated(chunks, RosterValidator(org_name, check_issued), on_invalid, with_row_numbers)
+
+
+def iter_record_rows(records, org_name, on_invalid=None, with_row_numbers=False, check_issued=False):
+    """
+    iter_roster_rows for an in-memory list of {uid, candidate_name, course_name} dicts
+    """
+    import pandas as pd
+    roster = pd.DataFrame(list(records), columns=REQUIRED_COLUMNS, dtype=str)
+    return _iter_validated([roster], RosterValidator(org_name, check_issued), on_invalid, with_row_numbers)
@@ -0,0 +1,164 @@
+import io
+import os
+import sys
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.cid_utils import compute_cid
+from utils.ipfs_utils import fetch_from_ipfs, upload_bytes_to_pinata, IPFSFetchError
+
+# "pinata" (IPFS through Pinata) or "local" (content-addressed files on this host)
+STORAGE_BACKEND = os.getenv("CERT_STORAGE", "pinata")
+LOCAL_STORE_DIR = os.getenv(
+    "LOCAL_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "certificate_store")
+)
+# Uploads in flight at once during bulk jobs; Pinata's request rate itself is capped by the HTTP client
+PIN_CONCURRENCY = int(os.getenv("PIN_CONCURRENCY", "8"))
+
+
+class StorageError(Exception):
+    """
+    Raised when stored content cannot be retrieved
+    """
+
+
+class PinataStore:
+    """
+    Certificates pinned to IPFS through Pinata and read back through the gateway
+    """
+
+    def __init__(self, api_key, api_secret):
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.configured = bool(api_key and api_secret)
+
+    def put(self, data, name="certificate.pdf"):
+        """
+        Store data and return its CID, or None on failure
+        """
+        return upload_bytes_to_pinata(data, name, self.api_key, self.api_secret)
+
+    def get(self, content_id):
+        try:
+            return fetch_from_ipfs(content_id)
+        except IPFSFetchError as e:
+            raise StorageError(str(e))
+
+    def open(self, content_id):
+        return io.BytesIO(self.get(content_id))
+
+
+class LocalContentStore:
+    """
+    Content-addressed store on the local filesystem. Ids are the same CIDv0s
+    Pinata assigns, so certificates issued against either backend verify the
+    same way and can be moved between them.
+    """
+
+    configured = True
+
+    def __init__(self, directory=LOCAL_STORE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, content_id):
+        # Ids come from the chain, so refuse anything that could escape the store directory
+        if not content_id.isalnum():
+            raise StorageError(f"Invalid content id: {content_id!r}")
+        return os.path.join(self.directory, content_id[-2:], content_id)
+
+    def put(self, data, name="certificate.pdf"):
+        """
+        Store data and return its CID, or None on failure
+        """
+        content_id = compute_cid(data)
+        path = self._path(content_id)
+        if os.path.exists(path):
+            return content_id
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        except OSError as e:
+            print(f"Error writing to local certificate store: {e}")
+            return None
+        return content_id
+
+    def get(self, content_id):
+        with self.open(content_id) as f:
+            return f.read()
+
+    def open(self, content_id):
+        try:
+            return open(self._path(content_id), "rb")
+        except OSError:
+            raise StorageError(f"Certificate {content_id} is not in the local store")
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage():
+    """
+    Return the process-wide certificate store selected by CERT_STORAGE
+    """
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            if STORAGE_BACKEND == "local":
+                _storage = LocalContentStore()
+            elif STORAGE_BACKEND == "pinata":
+                _storage = PinataStore(os.getenv("PINATA_API_KEY"), os.getenv("PINATA_API_SECRET"))
+            else:
+                raise ValueError(f"Unknown CERT_STORAGE backend: {STORAGE_BACKEND!r}")
+        return _storage
+
+
+def store_file(file_path, storage=None):
+    """
+    Store the file at file_path and return its id, or None on failure
+    """
+    storage = storage or get_storage()
+    with open(file_path, "rb") as f:
+        return storage.put(f.read(), os.path.basename(file_path))
+
+
+def store_bulk_certificates(results, storage=None, max_concurrency=PIN_CONCURRENCY):
+    """
+    Storage stage for bulk jobs. Consumes bulk generation results as they are
+    produced, stores each successful PDF (in memory or on disk) with at most
+    max_concurrency uploads in flight, and yields the results in input order
+    with 'ipfs_hash' set (None when the row failed to render or to store).
+    """
+    storage = storage or get_storage()
+    with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="storage") as executor:
+        pending = deque()
+        for result in results:
+            future = None
+            if result['status'] == 'success' and result.get('pdf_bytes') is not None:
+                future = executor.submit(storage.put, result['pdf_bytes'], result['file_name'])
+            elif result['status'] == 'success' and result['file_path']:
+                future = executor.submit(store_file, result['file_path'], storage)
+            pending.append((result, future))
+
+            # Hand back finished rows as soon as the head of the queue is done
+            while pending and (pending[0][1] is None or pending[0][1].done() or len(pending) > 2 * max_concurrency):
+                yield _stored(*pending.popleft())
+
+        while pending:
+            yield _stored(*pending.popleft())
+
+
+def _stored(result, future):
+    result['ipfs_hash'] = future.result() if future is not None else None
+    return result
@@ -1,53 +1,61 @@
 import streamlit as st
-import base64
-import requests
 import os
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from connection import contract
 
 
-def displayPDF(file):
+@st.cache_data(max_entries=64, show_spinner=False)
+def _preview_png(pdf_bytes):
+    from utils.cert_utils import render_certificate_preview
+    return render_certificate_preview(pdf_bytes)
 
-    with open(file, "rb") as f:
-        base64_pdf = base64.b64encode(f.read()).decode('utf-8')
 
-    pdf_display = F'<iframe src="data:application/pdf;base64,{base64_pdf}" width="700" height="1000" type="application/pdf"></iframe>'
+def displayPDF(file, file_name="certificate.pdf"):
+    """
+    Show a PDF given as a path, in-memory bytes or a file-like object (such as an
+    UploadedFile or BytesIO) as a first-page preview image, with the full PDF
+    served by Streamlit's media endpoint behind a download button
+    """
+    if isinstance(file, (bytes, bytearray, memoryview)):
+        pdf_bytes = bytes(file)
+    elif hasattr(file, "getvalue"):
+        pdf_bytes = file.getvalue()
+    elif hasattr(file, "read"):
+        pdf_bytes = file.read()
+    else:
+        with open(file, "rb") as f:
+            pdf_bytes = f.read()
 
-
-    st.markdown(pdf_display, unsafe_allow_html=True)
+    try:
+        st.image(_preview_png(pdf_bytes), width=700)
+    except Exception as e:
+        st.warning(f"Preview unavailable: {e}")
+    st.download_button("⬇️ Download PDF", pdf_bytes, file_name=file_name, mime="application/pdf")
 
 
 def view_certificate(certificate_id):
+    # Imported here so pages that only use the layout helpers stay light
+    from utils.cert_index import lookup_certificate
+    from utils.storage import get_storage, StorageError
     try:
-        # Get certificate data from blockchain
-        result = contract.functions.getCertificate(certificate_id).call()
+        # Get certificate data from the local index, falling back to the blockchain
+        result = lookup_certificate(certificate_id)
+        if result is None:
+            st.error("Certificate ID not found on blockchain")
+            return False
         ipfs_hash = result[4]
         
         st.write(f"[DEBUG] Retrieved IPFS hash from blockchain: {ipfs_hash}")
         
-        # Construct Pinata gateway URL
-        pinata_gateway_base_url = 'https://gateway.pinata.cloud/ipfs'
-        content_url = f"{pinata_gateway_base_url}/{ipfs_hash}"
-        st.write(f"[DEBUG] Attempting to fetch from Pinata: {content_url}")
-        
-        # Fetch PDF from Pinata with proper headers
-        headers = {
-            'Accept': 'application/pdf',
-            'User-Agent': 'Mozilla/5.0'
-        }
-        response = requests.get(content_url, headers=headers)
-        
-        if response.status_code != 200:
-            st.error(f"Failed to fetch certificate from IPFS. Status code: {response.status_code}")
-            st.write(f"[DEBUG] Pinata response: {response.text[:200]}...")  # Show first 200 chars of error
+        # Read from the configured certificate store (IPFS via Pinata, or the local content store)
+        try:
+            pdf_bytes = get_storage().get(ipfs_hash)
+        except StorageError as e:
+            st.error(str(e))
             return False
             
-        # Save and display PDF
-        with open("temp.pdf", 'wb') as pdf_file:
-            pdf_file.write(response.content)
-        displayPDF("temp.pdf")
-        os.remove("temp.pdf")
+        # Preview from memory; the PDF itself is only sent when downloaded
+        displayPDF(pdf_bytes, f"certificate_{certificate_id[:16]}.pdf")
         return True
         
     except Exception as e:
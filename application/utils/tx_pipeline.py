@@ -0,0 +1,219 @@
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from connection import get_w3
+
+# Transactions allowed in flight per pipeline before submit() blocks
+MAX_IN_FLIGHT = int(os.getenv("TX_MAX_IN_FLIGHT", "32"))
+# Seconds a transaction may stay unmined before it is re-sent with a higher gas price
+STUCK_TIMEOUT = float(os.getenv("TX_STUCK_TIMEOUT", "60"))
+MAX_REPLACEMENTS = 3
+GAS_PRICE_BUMP = 1.125  # nodes require at least +10% to accept a replacement
+CANCEL_GAS = 21000  # a plain value transfer
+POLL_INTERVAL = 0.5
+
+
+class NonceManager:
+    """
+    Hands out nonces locally per sender so concurrent submitters never race on the node
+    """
+
+    def __init__(self, web3):
+        self.web3 = web3
+        self._lock = threading.Lock()
+        self._next = {}
+
+    def next_nonce(self, sender):
+        with self._lock:
+            if sender not in self._next:
+                self._next[sender] = self.web3.eth.get_transaction_count(sender, 'pending')
+            nonce = self._next[sender]
+            self._next[sender] += 1
+            return nonce
+
+    def resync(self, sender):
+        """
+        Forget the local counter so the next nonce is read from the node again.
+        Only safe when no later nonce is in flight: the node's pending count
+        cannot see past a gap.
+        """
+        with self._lock:
+            self._next.pop(sender, None)
+
+
+class _PendingTx:
+    def __init__(self, key, tx, tx_hash, future):
+        self.key = key
+        self.tx = tx
+        self.tx_hashes = [tx_hash]
+        self.future = future
+        self.sent_at = time.monotonic()
+        self.replacements = 0
+
+
+class TransactionPipeline:
+    """
+    Submits contract transactions with locally assigned nonces, keeps at most
+    max_in_flight of them pending and collects receipts on a background thread.
+    submit() returns a Future resolving to a result dict with status
+    'confirmed', 'reverted', 'dropped' or 'error'.
+    """
+
+    def __init__(self, web3, sender, nonce_manager, max_in_flight=MAX_IN_FLIGHT,
+                 stuck_timeout=STUCK_TIMEOUT, max_replacements=MAX_REPLACEMENTS):
+        self.web3 = web3
+        self.sender = sender
+        self.nonces = nonce_manager
+        self.stuck_timeout = stuck_timeout
+        self.max_replacements = max_replacements
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._receipt_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="tx-receipts")
+        self._collector = threading.Thread(target=self._collect_receipts, name="tx-collector", daemon=True)
+        self._collector.start()
+
+    def submit(self, contract_fn, key=None, gas=None):
+        """
+        Send contract_fn as a transaction; blocks while the in-flight window is full
+        """
+        future = Future()
+        try:
+            # Estimate before taking a nonce so a reverting call never leaves a gap
+            gas = gas or int(contract_fn.estimateGas({'from': self.sender}) * 1.2)
+        except Exception as e:
+            future.set_result(self._result(key, 'reverted', error=str(e)))
+            return future
+
+        self._slots.acquire()
+        nonce = self.nonces.next_nonce(self.sender)
+        try:
+            tx = contract_fn.buildTransaction({
+                'from': self.sender,
+                'nonce': nonce,
+                'gas': gas,
+                'gasPrice': self.web3.eth.gas_price,
+            })
+            tx_hash = self.web3.eth.send_transaction(tx)
+        except Exception as e:
+            self.nonces.resync(self.sender)
+            self._slots.release()
+            future.set_result(self._result(key, 'error', error=str(e)))
+            return future
+
+        with self._lock:
+            self._pending[nonce] = _PendingTx(key, tx, tx_hash, future)
+        return future
+
+    def _result(self, key, status, tx_hash=None, receipt=None, error=None):
+        return {
+            'key': key,
+            'status': status,
+            'tx_hash': tx_hash.hex() if tx_hash is not None else None,
+            'block_number': receipt['blockNumber'] if receipt else None,
+            'gas_used': receipt['gasUsed'] if receipt else None,
+            'error': error,
+        }
+
+    def _resolve(self, nonce, result):
+        with self._lock:
+            pending = self._pending.pop(nonce, None)
+        if pending is not None:
+            self._slots.release()
+            pending.future.set_result(result)
+
+    def _collect_receipts(self):
+        while True:
+            with self._lock:
+                pending = list(self._pending.items())
+            if pending:
+                list(self._receipt_pool.map(lambda item: self._check(*item), pending))
+            time.sleep(POLL_INTERVAL)
+
+    def _check(self, nonce, pending):
+        # web3 is only loaded once a connection exists, not when this module is imported
+        from web3.exceptions import TransactionNotFound
+        try:
+            for tx_hash in pending.tx_hashes:
+                try:
+                    receipt = self.web3.eth.get_transaction_receipt(tx_hash)
+                except TransactionNotFound:
+                    continue
+                status = 'confirmed' if receipt['status'] == 1 else 'reverted'
+                self._resolve(nonce, self._result(pending.key, status, tx_hash, receipt))
+                return
+
+            if time.monotonic() - pending.sent_at < self.stuck_timeout:
+                return
+            if pending.replacements < self.max_replacements:
+                self._replace(pending)
+            else:
+                # Later nonces may already be in flight, so the nonce cannot simply be handed out
+                # again; use it up with a cancelling transfer instead, or they would queue behind it
+                self._cancel(pending)
+                self._resolve(nonce, self._result(
+                    pending.key, 'dropped', pending.tx_hashes[-1],
+                    error=f"not mined after {pending.replacements} replacements"
+                ))
+        except Exception as e:
+            print(f"Error checking transaction {nonce}: {e}")
+
+    def _cancel(self, pending):
+        """
+        Replace a transaction that will not be mined with a zero-value transfer to
+        the sender at the same nonce and a higher gas price, filling the nonce
+        """
+        tx = {
+            'from': self.sender,
+            'to': self.sender,
+            'value': 0,
+            'nonce': pending.tx['nonce'],
+            'gas': CANCEL_GAS,
+            'gasPrice': max(int(pending.tx['gasPrice'] * GAS_PRICE_BUMP), self.web3.eth.gas_price),
+        }
+        try:
+            self.web3.eth.send_transaction(tx)
+        except Exception as e:
+            # Typically "nonce too low": the original was mined after all
+            print(f"Error cancelling transaction {tx['nonce']}: {e}")
+
+    def _replace(self, pending):
+        """
+        Re-send a stuck transaction with the same nonce and a higher gas price
+        """
+        tx = dict(pending.tx)
+        tx['gasPrice'] = max(int(tx['gasPrice'] * GAS_PRICE_BUMP), self.web3.eth.gas_price)
+        try:
+            tx_hash = self.web3.eth.send_transaction(tx)
+        except Exception as e:
+            # Typically "nonce too low": an earlier copy was mined and is found next poll
+            print(f"Error replacing transaction {tx['nonce']}: {e}")
+            return
+        pending.tx = tx
+        pending.tx_hashes.append(tx_hash)
+        pending.replacements += 1
+        pending.sent_at = time.monotonic()
+
+
+_nonce_manager = None
+_pipelines = {}
+_pipelines_lock = threading.Lock()
+
+
+def get_transaction_pipeline(sender=None):
+    """
+    Return the process-wide pipeline for sender (defaults to the first node account).
+    Every Streamlit session shares it, so nonces are never assigned twice.
+    """
+    global _nonce_manager
+    w3 = get_w3()
+    sender = sender or w3.eth.accounts[0]
+    with _pipelines_lock:
+        if _nonce_manager is None:
+            _nonce_manager = NonceManager(w3)
+        if sender not in _pipelines:
+            _pipelines[sender] = TransactionPipeline(w3, sender, _nonce_manager)
+        return _pipelines[sender]
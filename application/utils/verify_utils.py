@@ -0,0 +1,194 @@
+import asyncio
+import os
+import sqlite3
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.cert_index import get_certificate_index, lookup_certificate, lookup_certificates
+from utils.chain_utils import READ_BATCH_SIZE, is_batch_anchored
+from utils.merkle_utils import verify_merkle_proof
+
+RECORD_FIELDS = ['uid', 'candidate_name', 'course_name', 'org_name', 'ipfs_hash']
+
+
+def parse_certificate_pdf(pdf_source):
+    """
+    Extract a certificate PDF's fields and the certificate id to verify: the
+    hash embedded in the PDF when present, recomputed from the fields otherwise.
+    Embedded metadata is only used when it matches the visible page (see
+    extract_certificate), and 'fields_match_id' says whether the fields hash to the id.
+    Certificates anchored as a Merkle batch also carry their proof ('merkle'),
+    and 'proof_valid' says whether it links the certificate to its root.
+    Needs no chain access, so it can run in a worker process.
+    """
+    # reportlab and pdfplumber are only loaded by callers that actually parse PDFs
+    from utils.cert_utils import compute_certificate_id, extract_certificate_with_proof
+    # Fields and proof come from one pass over the PDF
+    (uid, candidate_name, course_name, org_name, embedded_hash), merkle = extract_certificate_with_proof(pdf_source)
+    computed_id = compute_certificate_id(uid, candidate_name, course_name, org_name)
+    certificate_id = embedded_hash or computed_id
+    return {
+        'certificate_id': certificate_id,
+        'embedded_hash': embedded_hash,
+        'extracted': {'uid': uid, 'candidate_name': candidate_name, 'course_name': course_name, 'org_name': org_name},
+        'fields_match_id': certificate_id == computed_id,
+        'merkle': merkle,
+        # The proof only counts for the fields actually on the certificate
+        'proof_valid': bool(merkle) and certificate_id == computed_id and
+                       verify_merkle_proof(certificate_id, merkle['proof'], merkle['root']),
+    }
+
+
+def verification_result(certificate_id, record):
+    """
+    Shape a lookup record (or None) into the verification result returned to callers
+    """
+    return {
+        'certificate_id': certificate_id,
+        'valid': record is not None,
+        **dict(zip(RECORD_FIELDS, record or [None] * len(RECORD_FIELDS))),
+    }
+
+
+def verify_certificate_id(certificate_id):
+    return _mark_anchored_batches([verification_result(certificate_id, lookup_certificate(certificate_id))])[0]
+
+
+def _unverified_batch_roots(results):
+    """
+    {certificate_id: merkle_root} for the ids of invalid results that the index
+    lists as members of a Merkle batch
+    """
+    certificate_ids = {result['certificate_id'] for result in results if not result['valid']}
+    if not certificate_ids:
+        return {}
+    try:
+        return get_certificate_index().batch_roots(certificate_ids)
+    except sqlite3.Error as e:
+        print(f"Error reading certificate index: {e}")
+        return {}
+
+
+def _set_anchored_batches(results, batch_roots, anchored_roots):
+    """
+    Set 'in_anchored_batch' on id results: the anchored Merkle root of the batch
+    the certificate was issued in, else None. Such certificates are not on chain
+    by id and are verified from their PDF, which carries the inclusion proof.
+    """
+    for result in results:
+        merkle_root = batch_roots.get(result['certificate_id'])
+        result['in_anchored_batch'] = merkle_root if merkle_root in anchored_roots else None
+    return results
+
+
+def verify_certificate_ids(certificate_ids):
+    """
+    Verify many ids with batched lookups; results are in input order
+    """
+    certificate_ids = list(certificate_ids)
+    results = [verification_result(certificate_id, record)
+               for certificate_id, record in zip(certificate_ids, lookup_certificates(certificate_ids))]
+    return _mark_anchored_batches(results)
+
+
+def _mark_anchored_batches(results):
+    batch_roots = _unverified_batch_roots(results)
+    anchored_roots = {merkle_root for merkle_root in set(batch_roots.values()) if is_batch_anchored(merkle_root)}
+    return _set_anchored_batches(results, batch_roots, anchored_roots)
+
+
+def _read_index(certificate_ids):
+    return get_certificate_index().get_many(certificate_ids)
+
+
+async def verify_certificate_ids_async(client, certificate_ids):
+    """
+    verify_certificate_ids for event loops: ids missing from the local index are
+    read through client (an AsyncContractClient) in concurrent batched calls,
+    and so are the batch roots of ids issued in a Merkle batch
+    """
+    certificate_ids = list(certificate_ids)
+    found = {}
+    try:
+        # The first use builds the index (through web3) and reads are blocking SQLite
+        # calls, so run it off the loop rather than stall other requests
+        found = await asyncio.get_running_loop().run_in_executor(None, _read_index, certificate_ids)
+    except sqlite3.Error as e:
+        print(f"Error reading certificate index: {e}")
+
+    misses = list(dict.fromkeys(certificate_id for certificate_id in certificate_ids if certificate_id not in found))
+    chunks = [misses[i:i + READ_BATCH_SIZE] for i in range(0, len(misses), READ_BATCH_SIZE)]
+    for chunk, records in zip(chunks, await asyncio.gather(*(client.get_certificates(chunk) for chunk in chunks))):
+        found.update(zip(chunk, records))
+    results = [verification_result(certificate_id, found[certificate_id]) for certificate_id in certificate_ids]
+
+    batch_roots = {}
+    if not all(result['valid'] for result in results):
+        batch_roots = await asyncio.get_running_loop().run_in_executor(None, _unverified_batch_roots, results)
+    roots = list(set(batch_roots.values()))
+    anchored = await asyncio.gather(*(client.is_batch_anchored(merkle_root) for merkle_root in roots))
+    return _set_anchored_batches(results, batch_roots, {root for root, ok in zip(roots, anchored) if ok})
+
+
+def merkle_verification_result(parsed, anchored):
+    """
+    Verification result for a Merkle-batch certificate: valid when its proof
+    holds and the batch root is anchored. The record fields are the
+    certificate's own, as only the root is stored on chain.
+    """
+    extracted = parsed['extracted']
+    return {
+        'certificate_id': parsed['certificate_id'],
+        'valid': bool(parsed['proof_valid'] and anchored),
+        **{field: extracted.get(field) for field in RECORD_FIELDS},
+        'merkle_root': parsed['merkle']['root'],
+    }
+
+
+def _check_record_fields(result, parsed):
+    """
+    Fail a result whose on-chain record names a different certificate than the
+    PDF shows. Ids are hashes of the concatenated fields, so e.g. moving a
+    character from the UID into the name keeps the id but not the record.
+    """
+    if result['valid'] and parsed['fields_match_id']:
+        extracted = parsed['extracted']
+        mismatched = [field for field in RECORD_FIELDS[:4] if str(result[field]) != str(extracted[field])]
+        if mismatched:
+            result['valid'] = False
+            result['error'] = f"Certificate details differ from the issued record: {', '.join(mismatched)}"
+    return result
+
+
+def verify_parsed_certificate(parsed):
+    """
+    Verify the output of parse_certificate_pdf: one root lookup for
+    Merkle-batch certificates, the usual id lookup otherwise
+    """
+    if parsed['merkle']:
+        # A broken proof fails without touching the chain
+        anchored = parsed['proof_valid'] and is_batch_anchored(parsed['merkle']['root'])
+        result = merkle_verification_result(parsed, anchored)
+    else:
+        result = _check_record_fields(verify_certificate_id(parsed['certificate_id']), parsed)
+    result['extracted'] = parsed['extracted']
+    return result
+
+
+async def verify_parsed_certificate_async(client, parsed):
+    """
+    verify_parsed_certificate for event loops, reading through client (an AsyncContractClient)
+    """
+    if parsed['merkle']:
+        anchored = parsed['proof_valid'] and await client.is_batch_anchored(parsed['merkle']['root'])
+        result = merkle_verification_result(parsed, anchored)
+    else:
+        result = _check_record_fields((await verify_certificate_ids_async(client, [parsed['certificate_id']]))[0], parsed)
+    result['extracted'] = parsed['extracted']
+    return result
+
+
+def verify_certificate_pdf(pdf_source):
+    """
+    Parse a certificate PDF and verify it
+    """
+    return verify_parsed_certificate(parse_certificate_pdf(pdf_source))
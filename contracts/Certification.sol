@@ -13,6 +13,10 @@ contract Certification {
     mapping(string => Certificate) public certificates;
     event certificateGenerated(string certificate_id);
 
+    // Merkle roots of certificate batches, mapped to the block time they were anchored
+    mapping(bytes32 => uint256) public batchAnchoredAt;
+    event batchAnchored(bytes32 root, uint256 size);
+
     function generateCertificate(
         string memory _certificate_id,
         string memory _uid,
@@ -21,6 +25,53 @@ contract Certification {
         string memory _org_name,
         string memory _ipfs_hash
     ) public {
+        _generateCertificate(
+            _certificate_id,
+            _uid,
+            _candidate_name,
+            _course_name,
+            _org_name,
+            _ipfs_hash
+        );
+    }
+
+    function generateCertificatesBatch(
+        string[] memory _certificate_ids,
+        string[] memory _uids,
+        string[] memory _candidate_names,
+        string[] memory _course_names,
+        string[] memory _org_names,
+        string[] memory _ipfs_hashes
+    ) public {
+        require(
+            _uids.length == _certificate_ids.length &&
+                _candidate_names.length == _certificate_ids.length &&
+                _course_names.length == _certificate_ids.length &&
+                _org_names.length == _certificate_ids.length &&
+                _ipfs_hashes.length == _certificate_ids.length,
+            "Batch arrays must have the same length"
+        );
+
+        for (uint256 i = 0; i < _certificate_ids.length; i++) {
+            _generateCertificate(
+                _certificate_ids[i],
+                _uids[i],
+                _candidate_names[i],
+                _course_names[i],
+                _org_names[i],
+                _ipfs_hashes[i]
+            );
+        }
+    }
+
+    function _generateCertificate(
+        string memory _certificate_id,
+        string memory _uid,
+        string memory _candidate_name,
+        string memory _course_name,
+        string memory _org_name,
+        string memory _ipfs_hash
+    ) internal {
         // Check if certificate with the given ID already exists
         require(
             bytes(certificates[_certificate_id].ipfs_hash).length == 0,
@@ -43,6 +94,21 @@ contract Certification {
         emit certificateGenerated(_certificate_id);
     }
 
+    // Anchors a whole batch in one write; each certificate proves its
+    // membership with a Merkle proof checked off-chain against this root
+    function anchorBatch(bytes32 _root, uint256 _size) public {
+        require(_root != bytes32(0), "Batch root must not be empty");
+        require(batchAnchoredAt[_root] == 0, "Batch with this root already anchored");
+
+        batchAnchoredAt[_root] = block.timestamp;
+
+        emit batchAnchored(_root, _size);
+    }
+
+    function isBatchAnchored(bytes32 _root) public view returns (bool) {
+        return batchAnchoredAt[_root] != 0;
+    }
+
     function getCertificate(
         string memory _certificate_id
     )
@@ -79,4 +145,26 @@ contract Certification {
     ) public view returns (bool) {
         return bytes(certificates[_certificate_id].ipfs_hash).length != 0;
     }
+
+    function areVerified(
+        string[] memory _certificate_ids
+    ) public view returns (bool[] memory) {
+        bool[] memory verified = new bool[](_certificate_ids.length);
+        for (uint256 i = 0; i < _certificate_ids.length; i++) {
+            verified[i] =
+                bytes(certificates[_certificate_ids[i]].ipfs_hash).length != 0;
+        }
+        return verified;
+    }
+
+    // Missing certificates come back as an empty struct (empty ipfs_hash)
+    function getCertificates(
+        string[] memory _certificate_ids
+    ) public view returns (Certificate[] memory) {
+        Certificate[] memory found = new Certificate[](_certificate_ids.length);
+        for (uint256 i = 0; i < _certificate_ids.length; i++) {
+            found[i] = certificates[_certificate_ids[i]];
+        }
+        return found;
+    }
 }
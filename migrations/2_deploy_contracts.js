@@ -14,5 +14,11 @@ module.exports = async function (deployer) {
   // Save the updated configuration back to the file
   fs.writeFileSync('./deployment_config.json', JSON.stringify(configData, null, 2));
 
+  // Small ABI + address file the Python app loads instead of the full build artifact
+  fs.writeFileSync('./application/contract_cache.json', JSON.stringify({
+    address: deployedCertification.address,
+    abi: Certification.abi
+  }));
+
   console.log(`Certification contract deployed at address: ${deployedCertification.address}`);
 };